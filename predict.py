@@ -1,75 +1,497 @@
 # Prediction interface for Cog ⚙️
 # https://cog.run/python
 
+import asyncio
+import collections
 import subprocess
 import tempfile
 import os
 import json
+from dataclasses import dataclass
 from fractions import Fraction
 from cog import BasePredictor, Input, Path
 
+# NVENC replaced the x264-style preset names with p1 (fastest) .. p7 (best
+# quality) in SDK 10. The legacy names still work but select deprecated
+# code paths that disable multipass and adaptive quantization.
+_NVENC_PRESET_MAP = {
+    "ultrafast": "p1",
+    "superfast": "p1",
+    "veryfast": "p2",
+    "faster": "p3",
+    "fast": "p3",
+    "medium": "p4",
+    "slow": "p5",
+    "slower": "p6",
+    "veryslow": "p7",
+}
+
+# Fragmented MP4 keeps the moov atom at the front without faststart's
+# rewrite pass over the finished file (ffmpeg ignores faststart alongside
+# fragmentation). default_base_moof makes fragments self-contained, which
+# Media Source Extensions players expect.
+_FRAGMENTED_MOVFLAGS = "+frag_keyframe+empty_moov+default_base_moof"
+
+# NVENC engines per GPU, matched against the nvidia-smi name. Each engine
+# runs its own encode sessions in parallel; unlisted GPUs are assumed to
+# have one.
+_NVENC_ENGINES_BY_GPU_NAME = {
+    "RTX PRO 6000 Blackwell": 3,
+    "RTX 6000 Ada": 3,
+    "RTX 4090": 2,
+    "RTX 4080": 2,
+    "RTX 5090": 3,
+    "L40S": 3,
+    "L40": 3,
+    "L4": 2,
+}
+
+# Input codecs NVDEC decodes on every supported GPU, with the 4:2:0 pixel
+# formats it handles for each. Frames of other inputs are decoded on the CPU
+# even under -hwaccel cuda, so they cannot feed GPU filters.
+_NVDEC_PIX_FMTS = {
+    "h264": {"yuv420p", "yuvj420p", "nv12"},
+    "hevc": {"yuv420p", "yuvj420p", "nv12", "yuv420p10le", "p010le"},
+    "vp9": {"yuv420p", "yuvj420p", "nv12", "yuv420p10le", "p010le"},
+    "mpeg2video": {"yuv420p", "yuvj420p", "nv12"},
+}
+
+# The reverse filters buffer every decoded frame of their input. Boomerangs
+# longer than this are reversed in short segments of the source instead,
+# which bounds memory to one segment and lets the segments encode in parallel.
+_BOOMERANG_SEGMENTED_MIN_DURATION = 10.0
+_BOOMERANG_SEGMENT_SECONDS = 2
+
+# Web encodes place a keyframe every 2 seconds. Inputs are remuxed instead of
+# re-encoded only if their keyframes are at most this far apart, checked over
+# the first _KEYFRAME_SCAN_SECONDS.
+_WEB_MAX_KEYFRAME_GAP = 3.0
+_KEYFRAME_SCAN_SECONDS = 30
+
+
+@dataclass
+class VideoInfo:
+    """Input properties read from a single ffprobe run"""
+    codec: str
+    fps: float
+    width: int
+    height: int
+    bitrate: int | None
+    pix_fmt: str
+    duration: float
+    has_audio: bool
+    audio_codec: str | None
+
 
 class Predictor(BasePredictor):
     def setup(self) -> None:
         """Load the model into memory to make running multiple predictions efficient"""
-        self.cuda_decoder_available = False
+        self.cuda_hwaccel_available = False
         self.cuda_scaling_available = False
         self.nvenc_available = False
+        self.hevc_nvenc_available = False
+        self.gpu_compute_capability = (0, 0)
+        self.num_gpus = 0
+        self.num_nvenc_engines = 0
+        self._probe_cache: dict[tuple, dict] = {}
+        # Outputs and intermediates can be pointed at a disk-backed mount;
+        # $TMPDIR is often a RAM-backed tmpfs in containers
+        self.scratch_dir = os.getenv("SCRATCH_DIR") or tempfile.gettempdir()
+        os.makedirs(self.scratch_dir, exist_ok=True)
+
+        # Check that ffmpeg was built with NVENC before looking for a GPU. A
+        # visible GPU alone is not enough, and on builds without NVENC there is
+        # no point probing the rest of the NVIDIA toolchain.
+        self._ffmpeg_capabilities: dict[str, str] = {}
+        self.nvenc_available = self._ffmpeg_has_support("-encoders", "h264_nvenc")
+        self.gpu_available = self.nvenc_available and self._nvidia_gpu_visible()
+        self.libx265_available = self._ffmpeg_has_support("-encoders", "libx265")
 
-        # Check if NVIDIA GPU is available and ffmpeg exposes the NVIDIA codecs
-        # we need. A visible GPU alone is not enough.
+        if self.gpu_available:
+            self.cuda_hwaccel_available = self._ffmpeg_has_support("-hwaccels", "cuda")
+            self.cuda_scaling_available = self._ffmpeg_has_support("-filters", "scale_cuda")
+            self.hevc_nvenc_available = self._ffmpeg_has_support("-encoders", "hevc_nvenc")
+            self.gpu_compute_capability = self._query_compute_capability()
+            gpu_names = self._query_gpu_names()
+            self.num_gpus = max(1, len(gpu_names))
+            self.num_nvenc_engines = self._nvenc_engines_for(gpu_names[0] if gpu_names else "")
+
+            print(
+                f"NVIDIA GPU and h264_nvenc detected, hardware encoding available "
+                f"({self.num_gpus} GPU(s), {self.num_nvenc_engines} NVENC engine(s) each)"
+            )
+            if not self.cuda_hwaccel_available:
+                print("ffmpeg is missing the cuda hwaccel, hardware path will use CPU decoding")
+            if not self.cuda_scaling_available:
+                print("ffmpeg is missing scale_cuda, hardware path will use CPU scaling")
+
+            self._warm_up_gpu_pipeline()
+        elif self.nvenc_available:
+            print("ffmpeg has h264_nvenc, but no NVIDIA GPU detected; will use software encoding")
+        else:
+            print("ffmpeg is missing h264_nvenc; will use software encoding")
+
+        # Consumer GPUs only allow a few concurrent NVENC sessions, so cap the
+        # number of hardware encodes running at once across predictions. By
+        # default allow two sessions per engine on every GPU.
+        self._nvenc_semaphore = asyncio.Semaphore(int(os.getenv(
+            "NVENC_MAX_CONCURRENT",
+            str(max(2, 2 * self.num_gpus * self.num_nvenc_engines)),
+        )))
+
+        # Encoder options only depend on the capabilities detected above, so
+        # resolve every branch once here instead of on each request
+        self._cmd_templates = self._build_cmd_templates()
+
+    def _nvidia_gpu_visible(self) -> bool:
+        """Check whether an NVIDIA GPU is visible to this container."""
         try:
             subprocess.run(["nvidia-smi"], check=True, capture_output=True)
-            self.nvenc_available = self._ffmpeg_has_support("-encoders", "h264_nvenc")
-            self.cuda_decoder_available = self._ffmpeg_has_support("-decoders", "h264_cuvid")
-            self.cuda_scaling_available = self._ffmpeg_has_support("-filters", "scale_cuda")
-            self.gpu_available = self.nvenc_available
-
-            if self.gpu_available:
-                print("NVIDIA GPU and h264_nvenc detected, hardware encoding available")
-                if not self.cuda_decoder_available:
-                    print("ffmpeg is missing h264_cuvid, hardware path will use CPU decoding")
-                if not self.cuda_scaling_available:
-                    print("ffmpeg is missing scale_cuda, hardware path will use CPU scaling")
-            else:
-                print("NVIDIA GPU detected, but ffmpeg is missing h264_nvenc; will use software encoding")
+            return True
         except (subprocess.CalledProcessError, FileNotFoundError):
-            self.gpu_available = False
-            print("No NVIDIA GPU detected, will use software encoding")
+            return False
 
-    def _ffmpeg_cmd(self) -> list[str]:
-        """Base ffmpeg command with concise error output."""
-        return ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error"]
+    def _query_compute_capability(self) -> tuple[int, int]:
+        """Read the first GPU's CUDA compute capability, e.g. (8, 6).
 
-    def _muxing_queue_args(self) -> list[str]:
-        """Increase the output muxing queue for streams with encoder delay."""
-        return ["-max_muxing_queue_size", "4096"]
+        Returns (0, 0) when nvidia-smi cannot report it (older drivers).
+        """
+        try:
+            result = subprocess.run(
+                ["nvidia-smi", "--query-gpu=compute_cap", "--format=csv,noheader"],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            major, minor = result.stdout.splitlines()[0].strip().split(".")
+            return (int(major), int(minor))
+        except (subprocess.CalledProcessError, FileNotFoundError, IndexError, ValueError):
+            return (0, 0)
 
-    def _ffmpeg_has_support(self, list_arg: str, name: str) -> bool:
-        """Check whether ffmpeg exposes a codec/filter in its capability lists."""
+    def _query_gpu_names(self) -> list[str]:
+        """List the names of all visible GPUs, one per device index."""
         try:
             result = subprocess.run(
-                ["ffmpeg", "-hide_banner", list_arg],
+                ["nvidia-smi", "--query-gpu=name", "--format=csv,noheader"],
                 capture_output=True,
                 text=True,
                 check=True,
             )
         except (subprocess.CalledProcessError, FileNotFoundError):
-            return False
+            return []
+        return [line.strip() for line in result.stdout.splitlines() if line.strip()]
+
+    def _nvenc_engines_for(self, gpu_name: str) -> int:
+        """Look up how many NVENC engines a GPU model has."""
+        # Longest names first so "L40S" is not matched as "L4"
+        for model in sorted(_NVENC_ENGINES_BY_GPU_NAME, key=len, reverse=True):
+            if model in gpu_name:
+                return _NVENC_ENGINES_BY_GPU_NAME[model]
+        return 1
+
+    def _warm_up_gpu_pipeline(self) -> None:
+        """Run a tiny NVENC encode so the first prediction starts warm.
+
+        The first CUDA context created in a fresh container pays for driver
+        initialization and loading the NVENC/NVDEC libraries. Doing that once
+        here keeps it out of the first request's latency.
+        """
+        cmd = self._ffmpeg_cmd()
+        if self.cuda_scaling_available:
+            cmd.extend(["-init_hw_device", "cuda=gpu:0", "-filter_hw_device", "gpu"])
+        cmd.extend([
+            "-f", "lavfi",
+            "-i", "testsrc2=size=256x144:rate=30",
+            "-frames:v", "30",
+        ])
+        if self.cuda_scaling_available:
+            cmd.extend(["-vf", "format=nv12,hwupload,scale_cuda=128:72"])
+        cmd.extend(["-c:v", "h264_nvenc", "-f", "null", "-"])
+
+        try:
+            subprocess.run(cmd, check=True, capture_output=True, timeout=60)
+        except subprocess.CalledProcessError as e:
+            print(f"GPU warm-up failed: {self._format_process_error(e)}")
+        except subprocess.TimeoutExpired:
+            print("GPU warm-up timed out")
+
+    def _ffmpeg_cmd(self) -> list[str]:
+        """Base ffmpeg command with concise error output and no progress stats."""
+        return ["ffmpeg", "-y", "-hide_banner", "-nostats", "-loglevel", "error"]
+
+    def _cpu_filter_thread_args(self) -> list[str]:
+        """Run CPU filters (scale, format conversion) on every core."""
+        threads = str(os.cpu_count() or 1)
+        return ["-filter_threads", threads, "-filter_complex_threads", threads]
+
+    def _muxing_queue_args(self) -> list[str]:
+        """Increase the output muxing queue for streams with encoder delay."""
+        return ["-max_muxing_queue_size", "4096"]
+
+    def _nvdec_can_decode(self, info: VideoInfo) -> bool:
+        """Check whether NVDEC decodes the input, so frames can stay on the GPU."""
+        return (
+            self.cuda_hwaccel_available
+            and info.pix_fmt in _NVDEC_PIX_FMTS.get(info.codec, ())
+        )
+
+    def _hevc_encoder_available(self) -> bool:
+        """Check whether the encoder this machine uses first can write HEVC.
+
+        GPU machines encode with NVENC and need hevc_nvenc; CPU-only machines
+        need libx265.
+        """
+        if self.gpu_available:
+            return self.hevc_nvenc_available
+        return self.libx265_available
+
+    def _nvenc_preset(self, preset: str) -> str:
+        """Translate x264-style preset names to NVENC p1-p7 presets."""
+        return _NVENC_PRESET_MAP.get(preset, preset)
+
+    def _nvenc_quality_args(self, preset: str) -> list[str]:
+        """NVENC rate-control options for full-quality encodes."""
+        return [
+            "-preset", self._nvenc_preset(preset),
+            "-tune", "hq",
+            "-multipass", "qres",
+            "-rc", "vbr",
+            "-spatial_aq", "1",
+        ]
+
+    def _build_cmd_templates(self) -> dict[str, list[str]]:
+        """Per-output encoder argument templates for this machine.
+
+        Values contain the sentinel "__GOP__", which _fill_template
+        substitutes per request.
+        """
+        preview_rate_args = [
+            "-b:v", "700k",  # Target video bitrate
+            "-maxrate", "1000k",  # Maximum video bitrate
+            "-bufsize", "2000k",  # Buffer size
+            "-g", "__GOP__",  # Keyframe interval
+            "-movflags", _FRAGMENTED_MOVFLAGS,  # Fragmented MP4: moov written up front, no rewrite pass
+        ]
+        preview_audio_args = [
+            "-c:a", "aac",  # Use AAC audio codec
+            "-b:a", "128k",  # Audio bitrate
+            "-ac", "2",  # 2 audio channels (stereo)
+            "-ar", "44100",  # Audio sample rate
+        ]
+        # 480p previews run at the low-latency end of NVENC: p1 roughly
+        # doubles p4 throughput, and lookahead/AQ buy nothing visible at
+        # this size. Full-quality paths keep p4+ and hq.
+        nvenc_preview_args = [
+            "-preset", "p1",  # Fastest NVENC preset, quality is secondary for previews
+            "-tune", "ull",  # Ultra-low-latency tuning
+            "-rc", "cbr",  # Constant bitrate
+            "-rc-lookahead", "0",  # No lookahead buffering
+            "-no-scenecut", "1",  # Keep keyframes on the fixed GOP grid
+        ]
+
+        # Main profile B-frames and CABAC cost NVENC nothing and save ~15%
+        # over baseline; previews do not target baseline-only players
+        hw_h264_args = [
+            "-c:v", "h264_nvenc",  # NVIDIA hardware encoder
+            "-profile:v", "main",  # B-frames need main profile
+            "-bf", "2",  # B-frames for better quality per bit
+        ]
+        if self.gpu_compute_capability >= (7, 5):
+            # Turing and newer can use the middle B-frame as a reference
+            hw_h264_args.extend(["-b_ref_mode", "middle"])
+        hw_hevc_args = [
+            "-c:v", "hevc_nvenc",  # NVIDIA hardware HEVC encoder
+            "-profile:v", "main",
+            "-tag:v", "hvc1",  # Required for HEVC playback in Safari/QuickTime
+            "-zerolatency", "1",  # No frame reordering delay
+        ]
+
+        sw_h264_args = [
+            "-c:v", "libx264",  # Use H.264 codec
+            "-preset", "medium",  # Balance between encoding speed and compression
+            "-crf", "26",  # Constant Rate Factor (lower = better quality)
+            "-profile:v", "baseline",  # Most compatible H.264 profile
+            # Fixed GOP with no scene-cut keyframes, in the encoder's own terms
+            "-x264-params", "keyint=__GOP__:min-keyint=__GOP__:scenecut=0",
+        ]
+        if self.libx265_available:
+            sw_hevc_args = [
+                "-c:v", "libx265",  # Use HEVC codec
+                "-preset", "medium",  # Balance between encoding speed and compression
+                "-crf", "28",  # Roughly matches libx264 CRF 26 quality
+                "-tag:v", "hvc1",  # Required for HEVC playback in Safari/QuickTime
+                "-x265-params", "keyint=__GOP__:min-keyint=__GOP__:scenecut=0",
+            ]
+        else:
+            # Hosts whose hevc_nvenc encode fails fall back to H.264 here.
+            # Previews share one bitrate budget across codecs, so nothing
+            # else changes.
+            sw_hevc_args = sw_h264_args
+        sw_preview_args = [
+            "-threads", "0",  # Use every available core
+        ]
+
+        return {
+            "hw_h264_preview": [*hw_h264_args, *nvenc_preview_args, *preview_rate_args, *preview_audio_args],
+            "hw_hevc_preview": [*hw_hevc_args, *nvenc_preview_args, *preview_rate_args, *preview_audio_args],
+            "sw_h264_preview": [*sw_h264_args, *sw_preview_args, *preview_rate_args, *preview_audio_args],
+            "sw_hevc_preview": [*sw_hevc_args, *sw_preview_args, *preview_rate_args, *preview_audio_args],
+        }
+
+    def _fill_template(self, key: str, gop: int = 0) -> list[str]:
+        """Copy an encoder template with its sentinels replaced"""
+        # Sentinels can also sit inside encoder parameter strings
+        return [arg.replace("__GOP__", str(gop)) for arg in self._cmd_templates[key]]
+
+    def _input_args(
+        self,
+        input_path: str,
+        start_time: float,
+        end_time: float,
+        hwaccel_args: list[str] | None = None,
+        accurate_seek: bool = True
+    ) -> list[str]:
+        """Decoder, trim and input options, in the order ffmpeg applies them.
+
+        -ss/-to go before -i so the demuxer seeks to the keyframe before
+        start_time instead of decoding everything up to it. Decoding always
+        starts at that keyframe. With accurate_seek (the default) the frames
+        before start_time are dropped. Without it they are kept, so output
+        starts up to a GOP early, and those frames are encoded too.
+        """
+        args = list(hwaccel_args or [])
+        if start_time != 0:
+            args.extend(["-ss", str(start_time)])
+            if not accurate_seek:
+                args.append("-noaccurate_seek")
+        if end_time != -1:
+            args.extend(["-to", str(end_time)])
+        args.extend([*self._reconnect_args(input_path), "-i", input_path])
+        return args
+
+    def _reconnect_args(self, input_path: str) -> list[str]:
+        """Let ffmpeg resume dropped HTTP(S) inputs instead of failing."""
+        if not input_path.startswith(("http://", "https://")):
+            return []
+        return [
+            *self._protocol_whitelist_args(input_path),
+            "-reconnect", "1",
+            "-reconnect_streamed", "1",
+            "-reconnect_delay_max", "5",
+        ]
+
+    def _protocol_whitelist_args(self, input_path: str) -> list[str]:
+        """Keep HTTP(S) inputs on the network.
+
+        Playlists and nested protocols (concat:, subfile:, file:) would
+        otherwise let a remote input make ffmpeg read local files.
+        """
+        if not input_path.startswith(("http://", "https://")):
+            return []
+        return ["-protocol_whitelist", "http,https,tcp,tls"]
+
+    def _hwaccel_args(self, keep_frames_on_gpu: bool) -> list[str]:
+        """Decoder-side hwaccel options for the hardware encode paths.
+
+        With keep_frames_on_gpu, decoded frames stay in CUDA memory for
+        scale_cuda/NVENC. Otherwise ffmpeg picks any working hwaccel and falls
+        back to CPU decoding on bitstreams it cannot handle, handing system
+        memory frames to CPU filters.
+        """
+        if keep_frames_on_gpu:
+            return [
+                "-hwaccel", "cuda",
+                "-hwaccel_output_format", "cuda",
+                # Spare decoder surfaces so NVDEC keeps going while scale_cuda
+                # and NVENC still hold earlier frames
+                "-extra_hw_frames", "8",
+            ]
+        return ["-hwaccel", "auto"]
+
+    def _ffmpeg_has_support(self, list_arg: str, name: str) -> bool:
+        """Check whether ffmpeg exposes a codec/filter in its capability lists.
+
+        Each list (-encoders, -filters, ...) is fetched from ffmpeg only once.
+        """
+        if list_arg not in self._ffmpeg_capabilities:
+            try:
+                result = subprocess.run(
+                    ["ffmpeg", "-hide_banner", list_arg],
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                )
+                self._ffmpeg_capabilities[list_arg] = result.stdout
+            except (subprocess.CalledProcessError, FileNotFoundError):
+                self._ffmpeg_capabilities[list_arg] = ""
 
-        return name in result.stdout
+        return name in self._ffmpeg_capabilities[list_arg]
+
+    async def _run(
+        self,
+        cmd: list[str],
+        uses_nvenc: bool = False,
+        capture_stdout: bool = False
+    ) -> bytes:
+        """Run a command without blocking the event loop.
+
+        Raises CalledProcessError (with the tail of stderr) on a non-zero
+        exit, like subprocess.run(check=True). stdout is only kept for callers
+        that parse it (probes). stderr is drained as it is written and only
+        the last lines are kept, so a chatty process can neither fill the pipe
+        nor grow the worker's memory. Commands that open an NVENC session wait
+        for a free slot first.
+        """
+        if uses_nvenc:
+            async with self._nvenc_semaphore:
+                return await self._run(cmd, capture_stdout=capture_stdout)
+
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE if capture_stdout else asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stderr_tail: collections.deque[bytes] = collections.deque(maxlen=64)
+
+        async def drain_stderr():
+            async for line in proc.stderr:
+                stderr_tail.append(line)
+
+        async def read_stdout():
+            return await proc.stdout.read() if capture_stdout else b""
+
+        try:
+            stdout, _ = await asyncio.gather(read_stdout(), drain_stderr())
+            await proc.wait()
+        except asyncio.CancelledError:
+            proc.kill()
+            await proc.wait()
+            raise
+
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(
+                proc.returncode, cmd, output=stdout, stderr=b"".join(stderr_tail)
+            )
+        return stdout
 
     def _format_process_error(self, error: subprocess.CalledProcessError) -> str:
         """Extract the useful part of ffmpeg stderr for logging."""
-        stderr = error.stderr
-        if isinstance(stderr, bytes):
-            stderr = stderr.decode("utf-8", errors="replace")
-        stderr = (stderr or "").strip()
+        stderr = self._tail(error.stderr or b"").strip()
         return stderr or str(error)
 
-    def predict(
+    def _tail(self, output: bytes | str, n: int = 4096) -> str:
+        """Decode only the last n bytes of process output."""
+        if isinstance(output, str):
+            return output[-n:]
+        return output[-n:].decode("utf-8", errors="replace")
+
+    async def predict(
         self,
-        video: Path = Input(description="Input video file URL to process"),
+        video: Path = Input(description="Input video file URL to process", default=None),
+        video_url: str = Input(
+            description="HTTP(S) URL of the input video, streamed by ffmpeg while it encodes instead of being downloaded first. Used instead of video",
+            default=None
+        ),
         task: str = Input(
             description="Video processing task to perform",
             default="create_preview_video",
@@ -77,31 +499,78 @@ class Predictor(BasePredictor):
         ),
         start_time: float = Input(description="Start time in seconds for trimming", default=0),
         end_time: float = Input(description="End time in seconds for trimming (-1 for end of video)", default=-1),
+        codec: str = Input(
+            description="Output codec for preview and web videos. HEVC gives smaller files but needs a client that can play it",
+            default="h264",
+            choices=["h264", "hevc"]
+        ),
+        force_reencode: bool = Input(
+            description="Always re-encode for reencode_for_web, even when the input only needs remuxing",
+            default=False
+        ),
     ) -> Path:
         """Process video with selected task using hardware-accelerated encoding when available"""
 
+        if video_url:
+            # ffmpeg also accepts local paths and file:/concat:/subfile: URLs,
+            # which must not be reachable from the public input. The same
+            # prefix check decides which inputs get the protocol whitelist.
+            if not video_url.startswith(("http://", "https://")):
+                raise ValueError("video_url must be an http:// or https:// URL")
+            source = video_url
+        elif video is not None:
+            source = str(video)
+        else:
+            raise ValueError("Either video or video_url is required")
+
         # Default parameters
         preset = "medium"
         bitrate = "20M"
 
-        if task == "create_preview_video":
-            return self._create_preview_video(video, start_time, end_time, preset, bitrate)
-        elif task == "boomerang":
-            return self._create_boomerang(video, start_time, end_time, preset, bitrate)
-        elif task == "reencode_for_web":
-            return self._reencode_for_web(video, start_time, end_time)
-        elif task == "trim_precise":
-            return self._trim_video_precise(video, start_time, end_time)
-        else:
-            raise ValueError(f"Unknown task: {task}")
+        output_path = self._tmp(".mp4")
+        try:
+            if task == "create_preview_video":
+                return await self._create_preview_video(source, output_path, start_time, end_time, preset, bitrate, codec)
+            elif task == "boomerang":
+                return await self._create_boomerang(source, output_path, start_time, end_time, preset, bitrate)
+            elif task == "reencode_for_web":
+                return await self._reencode_for_web(source, output_path, start_time, end_time, codec, force_reencode)
+            elif task == "trim_precise":
+                return await self._trim_video_precise(source, output_path, start_time, end_time)
+            else:
+                raise ValueError(f"Unknown task: {task}")
+        except BaseException:
+            # Failed or cancelled predictions must not leak their output file
+            self._discard(output_path)
+            raise
+        finally:
+            # Cog reuses this instance, so drop the probe before the input
+            # file is deleted and its path handed to a later request
+            self._forget_probe(source)
     
-    def _create_preview_video(
+    def _tmp(self, suffix: str) -> str:
+        """Reserve a unique temporary file path"""
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=self.scratch_dir)
+        os.close(fd)
+        return path
+    
+    def _discard(self, *paths: str):
+        """Delete temporary files, ignoring ones that are already gone"""
+        for path in paths:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+    
+    async def _create_preview_video(
         self,
-        video: Path,
+        video: str,
+        output_path: str,
         start_time: float,
         end_time: float,
         preset: str,
-        bitrate: str
+        bitrate: str,
+        codec: str
     ) -> Path:
         """Create a low resolution preview video optimized for web seeking
         
@@ -109,25 +578,26 @@ class Predictor(BasePredictor):
         1. Reducing resolution to 480p
         2. Using a moderate bitrate while maintaining good quality
         3. Adding more frequent keyframes for better seeking
-        4. Using H.264 codec for compatibility
+        4. Using H.264 codec for compatibility (or HEVC on request)
         5. Optimizing audio for web streaming
         """
-        # Create temporary output file
-        output_file = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False)
-        output_path = output_file.name
-        output_file.close()
-        
-        # Check input video codec
-        input_codec = self._get_video_codec(str(video))
-        print(f"Input video codec: {input_codec}")
-        
         # Try hardware-accelerated encoding first
         # Note: For small videos or short clips, CPU encoding might be faster due to
         # GPU initialization overhead. The hardware version uses GPU scaling (scale_cuda)
         # to avoid CPU bottlenecks when scaling video.
+        if codec == "hevc" and not self._hevc_encoder_available():
+            print("No HEVC encoder available, falling back to H.264 preview")
+            codec = "h264"
+        
+        # Sources that are already preview-sized are not resized (or upscaled)
+        info = await self._probe_all(video)
+        resize = info.height > 480
+        gop = self._preview_gop(info.fps)
+        
         if self.gpu_available:
-            success = self._encode_preview_with_hardware(
-                str(video), output_path, start_time, end_time, input_codec
+            success = await self._encode_preview_with_hardware(
+                str(video), output_path, start_time, end_time, codec, resize, gop,
+                gpu_decode=self._nvdec_can_decode(info),
             )
             if success:
                 print("Successfully encoded preview with hardware acceleration")
@@ -135,154 +605,332 @@ class Predictor(BasePredictor):
         
         # Fallback to software encoding
         print("Using software encoding for preview")
-        self._encode_preview_with_software(
-            str(video), output_path, start_time, end_time
+        await self._encode_preview_with_software(
+            str(video), output_path, start_time, end_time, codec, resize, gop
         )
         
         return Path(output_path)
     
-    def _create_boomerang(
+    async def _create_boomerang(
         self,
-        video: Path,
+        video: str,
+        output_path: str,
         start_time: float,
         end_time: float,
         preset: str,
         bitrate: str
     ) -> Path:
-        """Create a boomerang effect (forward + reverse playback)"""
-        # Create temporary files
-        trimmed_file = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False)
-        trimmed_path = trimmed_file.name
-        trimmed_file.close()
-        
-        reversed_file = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False)
-        reversed_path = reversed_file.name
-        reversed_file.close()
+        """Create a boomerang effect (forward + reverse playback)
+
+        The trimmed clip is split, reversed and concatenated inside a single
+        filtergraph so every frame is decoded and encoded exactly once.
+        """
+        input_path = str(video)
+        info = await self._probe_all(input_path)
+        has_audio = info.has_audio
+        clip_end = end_time if end_time != -1 else info.duration
+        segmented = clip_end - start_time > _BOOMERANG_SEGMENTED_MIN_DURATION
         
-        output_file = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False)
-        output_path = output_file.name
-        output_file.close()
+        if self.gpu_available:
+            # reverse only runs on the CPU, so decode in hardware but hand
+            # the filtergraph system memory frames
+            try:
+                await self._render_boomerang(
+                    input_path, output_path, start_time, end_time, has_audio, segmented,
+                    self._hwaccel_args(keep_frames_on_gpu=False),
+                    ["-c:v", "h264_nvenc", *self._nvenc_quality_args(preset), "-b:v", bitrate],
+                    uses_nvenc=True,
+                )
+                return Path(output_path)
+            except subprocess.CalledProcessError as e:
+                print(f"Hardware boomerang encoding failed: {self._format_process_error(e)}")
         
         try:
-            # First, trim and encode the video
-            input_codec = self._get_video_codec(str(video))
-            
-            # Create trimmed version
-            if self.gpu_available:
-                success = self._encode_with_hardware(
-                    str(video), trimmed_path, start_time, end_time, preset, bitrate, input_codec
-                )
-                if not success:
-                    self._encode_with_software(
-                        str(video), trimmed_path, start_time, end_time, preset, bitrate
-                    )
-            else:
-                self._encode_with_software(
-                    str(video), trimmed_path, start_time, end_time, preset, bitrate
-                )
+            await self._render_boomerang(
+                input_path, output_path, start_time, end_time, has_audio, segmented,
+                [],
+                ["-c:v", "libx264", "-preset", preset, "-b:v", bitrate],
+                uses_nvenc=False,
+            )
+            return Path(output_path)
+        except subprocess.CalledProcessError as e:
+            error_msg = f"Boomerang creation failed: {self._format_process_error(e)}"
+            print(error_msg)
+            raise RuntimeError(error_msg)
+    
+    async def _render_boomerang(
+        self,
+        input_path: str,
+        output_path: str,
+        start_time: float,
+        end_time: float,
+        has_audio: bool,
+        segmented: bool,
+        input_args: list[str],
+        video_codec_args: list[str],
+        uses_nvenc: bool
+    ):
+        """Run the boomerang pipeline with one encoder. Raises CalledProcessError."""
+        if segmented:
+            await self._boomerang_segmented(
+                input_path, output_path, start_time, end_time, has_audio,
+                input_args, video_codec_args, uses_nvenc
+            )
+        else:
+            cmd = self._boomerang_cmd(
+                input_path, output_path, start_time, end_time, has_audio,
+                input_args, video_codec_args
+            )
+            await self._run(cmd, uses_nvenc=uses_nvenc)
+    
+    async def _boomerang_segmented(
+        self,
+        input_path: str,
+        output_path: str,
+        start_time: float,
+        end_time: float,
+        has_audio: bool,
+        input_args: list[str],
+        video_codec_args: list[str],
+        uses_nvenc: bool
+    ):
+        """Build a long boomerang from independently reversed segments
+        
+        The forward clip and every reversed segment are read straight from
+        the source, so they encode concurrently instead of waiting on a
+        forward pass. The forward clip and the reversed segments in
+        descending order are then joined by the concat demuxer without
+        re-encoding.
+        """
+        audio_args = ["-c:a", "aac", "-b:a", "128k"] if has_audio else []
+        clip_end = end_time if end_time != -1 else (await self._probe_all(input_path)).duration
+        
+        with tempfile.TemporaryDirectory(dir=self.scratch_dir) as work_dir:
+            forward_path = os.path.join(work_dir, "forward.mp4")
+            cmd = self._ffmpeg_cmd()
+            cmd.extend(self._input_args(input_path, start_time, end_time, input_args))
+            cmd.extend([
+                "-map", "0:v:0",
+                "-map", "0:a:0?",
+                *video_codec_args,
+                *audio_args,
+                *self._muxing_queue_args(),
+                forward_path,
+            ])
+            encode_cmds = [cmd]
             
-            # Create reversed version
-            reverse_cmd = [
-                "ffmpeg", "-y",
-                "-i", trimmed_path,
-                "-vf", "reverse",
-                "-af", "areverse"
-            ]
+            # Frame-accurate input-side trims keep adjacent segments from
+            # overlapping or leaving gaps
+            reversed_paths = []
+            segment_start = start_time
+            while segment_start < clip_end:
+                segment_end = segment_start + _BOOMERANG_SEGMENT_SECONDS
+                if segment_end >= clip_end:
+                    segment_end = end_time
+                reversed_path = os.path.join(work_dir, f"rev_{len(reversed_paths):04d}.mp4")
+                
+                cmd = self._ffmpeg_cmd()
+                cmd.extend(self._input_args(input_path, segment_start, segment_end, input_args))
+                cmd.extend(["-map", "0:v:0", "-map", "0:a:0?", "-vf", "reverse"])
+                if has_audio:
+                    cmd.extend(["-af", "areverse"])
+                cmd.extend(video_codec_args)
+                if uses_nvenc and self.num_gpus > 1:
+                    # Spread the segments round-robin over every GPU's encoders
+                    cmd.extend(["-gpu", str(len(encode_cmds) % self.num_gpus)])
+                cmd.extend([*audio_args, *self._muxing_queue_args(), reversed_path])
+                
+                encode_cmds.append(cmd)
+                reversed_paths.append(reversed_path)
+                segment_start += _BOOMERANG_SEGMENT_SECONDS
             
-            if self.gpu_available:
-                reverse_cmd.extend([
-                    "-c:v", "h264_nvenc",
-                    "-preset", preset,
-                    "-b:v", bitrate
-                ])
+            # Every encode holds a reverse window in memory and libx264 uses
+            # every core, so only run a few at once: two per NVENC engine, or
+            # one per two cores on the CPU path
+            if uses_nvenc:
+                limit = 2 * max(1, self.num_gpus * self.num_nvenc_engines)
             else:
-                reverse_cmd.extend([
-                    "-c:v", "libx264",
-                    "-preset", preset,
-                    "-b:v", bitrate
-                ])
+                limit = max(1, (os.cpu_count() or 1) // 2)
+            slots = asyncio.Semaphore(limit)
             
-            reverse_cmd.extend([
-                "-c:a", "aac",
-                "-b:a", "128k",
-                reversed_path
-            ])
+            async def encode(cmd: list[str]):
+                async with slots:
+                    await self._run(cmd, uses_nvenc=uses_nvenc)
             
-            subprocess.run(reverse_cmd, check=True, capture_output=True)
+            # Wait for every encode before raising so none is still writing
+            # when the work directory is removed
+            results = await asyncio.gather(
+                *(encode(cmd) for cmd in encode_cmds),
+                return_exceptions=True,
+            )
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
             
-            # Create concat file
-            concat_file = tempfile.NamedTemporaryFile(mode='w', suffix=".txt", delete=False)
-            concat_file.write(f"file '{trimmed_path}'\n")
-            concat_file.write(f"file '{reversed_path}'\n")
-            concat_file.close()
+            list_path = os.path.join(work_dir, "concat.txt")
+            with open(list_path, "w") as f:
+                for path in [forward_path, *reversed(reversed_paths)]:
+                    f.write(f"file '{path}'\n")
             
-            # Concatenate forward and reverse
-            concat_cmd = [
-                "ffmpeg", "-y",
+            cmd = self._ffmpeg_cmd()
+            cmd.extend([
                 "-f", "concat",
                 "-safe", "0",
-                "-i", concat_file.name,
+                "-i", list_path,
                 "-c", "copy",
-                output_path
-            ]
-            
-            subprocess.run(concat_cmd, check=True, capture_output=True)
-            
-            # Cleanup temporary files
-            os.unlink(trimmed_path)
-            os.unlink(reversed_path)
-            os.unlink(concat_file.name)
-            
-            return Path(output_path)
-            
-        except subprocess.CalledProcessError as e:
-            # Cleanup on error
-            for path in [trimmed_path, reversed_path, output_path]:
-                if os.path.exists(path):
-                    os.unlink(path)
-            error_msg = f"Boomerang creation failed: {e.stderr.decode('utf-8', errors='replace')}"
-            print(error_msg)
-            raise RuntimeError(error_msg)
+                "-movflags", "+faststart",
+                output_path,
+            ])
+            await self._run(cmd)
     
-    def _get_video_codec(self, input_path: str) -> str:
-        """Get the codec of the input video"""
-        try:
-            cmd = [
-                "ffprobe",
-                "-v", "error",
-                "-select_streams", "v:0",
-                "-show_entries", "stream=codec_name",
-                "-of", "default=noprint_wrappers=1:nokey=1",
-                input_path
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            return result.stdout.strip()
-        except subprocess.CalledProcessError:
-            return "unknown"
+    def _boomerang_cmd(
+        self,
+        input_path: str,
+        output_path: str,
+        start_time: float,
+        end_time: float,
+        has_audio: bool,
+        input_args: list[str],
+        video_codec_args: list[str]
+    ) -> list[str]:
+        """Build the single-process trim + reverse + concat boomerang command"""
+        cmd = self._ffmpeg_cmd()
+        
+        # A boomerang does not need a frame-exact start, so begin at the
+        # keyframe before start_time
+        cmd.extend(self._input_args(
+            input_path, start_time, end_time, input_args, accurate_seek=False
+        ))
+        
+        # Fan the decoded stream out, reverse one branch and fan it back in
+        filters = [
+            "[0:v:0]split=2[v1][v2]",
+            "[v2]reverse[vr]",
+            "[v1][vr]concat=n=2:v=1:a=0[v]",
+        ]
+        maps = ["-map", "[v]"]
+        if has_audio:
+            filters.extend([
+                "[0:a:0]asplit=2[a1][a2]",
+                "[a2]areverse[ar]",
+                "[a1][ar]concat=n=2:v=0:a=1[a]",
+            ])
+            maps.extend(["-map", "[a]"])
+        
+        cmd.extend([
+            "-filter_complex", ";".join(filters),
+            # split/reverse/concat are single-threaded per filter, let the
+            # graph run its branches on every core
+            "-filter_complex_threads", str(os.cpu_count() or 1),
+            *maps,
+            *video_codec_args,
+        ])
+        
+        if has_audio:
+            cmd.extend(["-c:a", "aac", "-b:a", "128k"])
+        
+        cmd.extend([*self._muxing_queue_args(), output_path])
+        return cmd
     
-    def _get_video_fps(self, input_path: str) -> float:
-        """Get the frame rate of the input video"""
+    async def _probe(self, input_path: str) -> dict:
+        """Probe all streams and the container once and memoize the result
+        
+        Returns ffprobe's JSON document ({"streams": [...], "format": {...}})
+        limited to the fields _probe_all and _get_audio_bitrate read, or an
+        empty dict if the input cannot be probed. Results, failures
+        included, are cached per (path, mtime, size).
+        """
+        # Remote and missing inputs cannot be stat()ed; they are forgotten
+        # after the prediction anyway
+        cache_key = (input_path, None, None)
+        if not input_path.startswith(("http://", "https://")):
+            try:
+                stat = os.stat(input_path)
+                cache_key = (input_path, stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                pass
+        
+        if cache_key in self._probe_cache:
+            return self._probe_cache[cache_key]
+        
         try:
             cmd = [
                 "ffprobe",
                 "-v", "error",
-                "-select_streams", "v:0",
-                "-show_entries", "stream=avg_frame_rate,r_frame_rate",
+                *self._protocol_whitelist_args(input_path),
+                # Only the fields the callers read, instead of every stream
+                # and container property
+                "-show_entries",
+                "stream=codec_type,codec_name,width,height,pix_fmt,"
+                "avg_frame_rate,r_frame_rate,bit_rate:format=duration",
                 "-of", "json",
                 input_path
             ]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            data = json.loads(result.stdout)
-            if "streams" in data and len(data["streams"]) > 0:
-                stream = data["streams"][0]
-                for field in ("avg_frame_rate", "r_frame_rate"):
-                    fps = self._parse_frame_rate(stream.get(field))
-                    if fps is not None:
-                        return fps
-        except (subprocess.CalledProcessError, ValueError, ZeroDivisionError, KeyError, json.JSONDecodeError):
-            return 30.0  # Default to 30 fps if we can't determine
-        return 30.0
-
+            probe = json.loads(await self._run(cmd, capture_stdout=True))
+        except (subprocess.CalledProcessError, json.JSONDecodeError):
+            # Remember failures too, so callers fall back to defaults
+            # without starting ffprobe again
+            probe = {}
+        
+        self._probe_cache[cache_key] = probe
+        return probe
+    
+    async def _probe_all(self, input_path: str) -> VideoInfo:
+        """Collect every input property the tasks use from one probe
+        
+        Properties missing from the probe fall back to defaults: 30 fps,
+        1080p, yuv420p and an unknown duration of 0.
+        """
+        probe = await self._probe(input_path)
+        video = self._first_stream(probe, "video")
+        audio = self._first_stream(probe, "audio")
+        
+        fps = 30.0
+        for field in ("avg_frame_rate", "r_frame_rate"):
+            parsed = self._parse_frame_rate(video.get(field))
+            if parsed is not None:
+                fps = parsed
+                break
+        
+        width, height = video.get("width"), video.get("height")
+        if not (width and height):
+            width, height = 1920, 1080
+        
+        try:
+            bitrate = int(video["bit_rate"])
+        except (KeyError, ValueError):
+            bitrate = None
+        
+        try:
+            duration = float(probe["format"]["duration"])
+        except (KeyError, ValueError):
+            duration = 0.0
+        
+        return VideoInfo(
+            codec=video.get("codec_name", "unknown"),
+            fps=fps,
+            width=int(width),
+            height=int(height),
+            bitrate=bitrate,
+            pix_fmt=video.get("pix_fmt", "yuv420p"),
+            duration=duration,
+            # Without a probe, assume audio and let ffmpeg report a real error
+            has_audio=bool(audio) or not probe,
+            audio_codec=audio.get("codec_name"),
+        )
+    
+    def _forget_probe(self, input_path: str):
+        """Drop cached probe results for an input"""
+        for cache_key in [key for key in self._probe_cache if key[0] == input_path]:
+            self._probe_cache.pop(cache_key, None)
+    
+    def _first_stream(self, probe: dict, codec_type: str) -> dict:
+        """Return the first "video" or "audio" stream of a probe result"""
+        for stream in probe.get("streams", []):
+            if stream.get("codec_type") == codec_type:
+                return stream
+        return {}
+    
     def _parse_frame_rate(self, value: str) -> float | None:
         """Parse ffprobe frame-rate strings and reject clearly invalid metadata."""
         if not value or value == "N/A":
@@ -301,279 +949,120 @@ class Predictor(BasePredictor):
 
         return fps
     
-    def _get_video_resolution(self, input_path: str) -> tuple[int, int]:
-        """Get the resolution (width, height) of the input video"""
-        try:
-            # Use JSON output for more reliable parsing
-            cmd = [
-                "ffprobe",
-                "-v", "error",
-                "-select_streams", "v:0",
-                "-show_entries", "stream=width,height",
-                "-of", "json",
-                input_path
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            data = json.loads(result.stdout)
-            if "streams" in data and len(data["streams"]) > 0:
-                stream = data["streams"][0]
-                width = stream.get("width")
-                height = stream.get("height")
-                if width and height:
-                    return (int(width), int(height))
-            return (1920, 1080)  # Default to 1080p if we can't determine
-        except (subprocess.CalledProcessError, ValueError, KeyError, json.JSONDecodeError):
-            return (1920, 1080)  # Default to 1080p if we can't determine
-    
-    def _get_video_bitrate(self, input_path: str) -> int:
-        """Get the bitrate of the input video in bps"""
-        try:
-            cmd = [
-                "ffprobe",
-                "-v", "error",
-                "-select_streams", "v:0",
-                "-show_entries", "stream=bit_rate",
-                "-of", "default=noprint_wrappers=1:nokey=1",
-                input_path
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            bitrate_str = result.stdout.strip()
-            if bitrate_str and bitrate_str != "N/A":
-                return int(bitrate_str)
-            return None
-        except (subprocess.CalledProcessError, ValueError):
-            return None
-    
-    def _encode_with_hardware(
+    async def _encode_preview_with_hardware(
         self,
         input_path: str,
         output_path: str,
         start_time: float,
         end_time: float,
-        preset: str,
-        bitrate: str,
-        input_codec: str
-    ) -> bool:
-        """Try to encode using hardware acceleration"""
-        cmd = self._ffmpeg_cmd()
-        
-        # Use hardware decoder if input is h264
-        if input_codec == "h264" and self.cuda_decoder_available:
-            cmd.extend([
-                "-hwaccel", "cuda",
-                "-hwaccel_output_format", "cuda",
-                "-c:v", "h264_cuvid",
-            ])
-        
-        # Add trimming parameters
-        if start_time != 0:
-            cmd.extend(["-ss", str(start_time)])
-        
-        if end_time != -1:
-            cmd.extend(["-to", str(end_time)])
-        
-        # Add input and encoding parameters
-        cmd.extend([
-            "-i", input_path,
-            "-c:v", "h264_nvenc",  # NVIDIA hardware encoder
-            "-preset", preset,
-            "-b:v", bitrate,
-            "-c:a", "aac",
-            "-b:a", "128k",
-            *self._muxing_queue_args(),
-            output_path
-        ])
-        
-        try:
-            subprocess.run(cmd, check=True, capture_output=True)
-            return True
-        except subprocess.CalledProcessError as e:
-            print(f"Hardware encoding failed: {self._format_process_error(e)}")
-            return False
-    
-    def _encode_with_software(
-        self,
-        input_path: str,
-        output_path: str,
-        start_time: float,
-        end_time: float,
-        preset: str,
-        bitrate: str
-    ):
-        """Encode using software encoder (fallback)"""
-        cmd = self._ffmpeg_cmd()
-        
-        # Add trimming parameters
-        if start_time != 0:
-            cmd.extend(["-ss", str(start_time)])
-        
-        if end_time != -1:
-            cmd.extend(["-to", str(end_time)])
-        
-        # Add input and encoding parameters
-        cmd.extend([
-            "-i", input_path,
-            "-c:v", "libx264",  # Software encoder
-            "-preset", preset,
-            "-b:v", bitrate,
-            "-c:a", "aac",
-            "-b:a", "128k",
-            *self._muxing_queue_args(),
-            output_path
-        ])
-        
-        try:
-            subprocess.run(cmd, check=True, capture_output=True)
-        except subprocess.CalledProcessError as e:
-            error_msg = f"Software encoding failed: {self._format_process_error(e)}"
-            print(error_msg)
-            raise RuntimeError(error_msg)
-    
-    def _encode_preview_with_hardware(
-        self,
-        input_path: str,
-        output_path: str,
-        start_time: float,
-        end_time: float,
-        input_codec: str
+        codec: str,
+        resize: bool,
+        gop: int,
+        gpu_decode: bool
     ) -> bool:
         """Try to encode preview using hardware acceleration"""
+        # Keep the whole decode -> scale -> encode pipeline in GPU memory
+        # when NVDEC decodes the input and ffmpeg can scale there
+        use_cuda_filters = gpu_decode and self.cuda_scaling_available
         cmd = self._ffmpeg_cmd()
+        cmd.extend(self._input_args(
+            input_path, start_time, end_time,
+            self._hwaccel_args(keep_frames_on_gpu=use_cuda_filters),
+        ))
         
-        # Use hardware decoder and hardware scaling if input is h264
-        use_cuda_filters = input_codec == "h264" and self.cuda_decoder_available
-        if use_cuda_filters:
-            cmd.extend([
-                "-hwaccel", "cuda",
-                "-hwaccel_output_format", "cuda",
-                "-c:v", "h264_cuvid"
-            ])
-        
-        # Add trimming parameters
-        if start_time != 0:
-            cmd.extend(["-ss", str(start_time)])
-        
-        if end_time != -1:
-            cmd.extend(["-to", str(end_time)])
-        
-        # Add input and use hardware scaling
-        cmd.extend(["-i", input_path])
-        
-        # Use GPU-accelerated scaling if we have hardware decoding
-        if use_cuda_filters and self.cuda_scaling_available:
-            cmd.extend([
-                "-vf", "scale_cuda=-2:480",  # GPU-accelerated scaling to 480p
-            ])
+        if use_cuda_filters and resize:
+            cmd.extend(["-vf", "scale_cuda=-2:480:format=yuv420p"])  # GPU scaling to 8-bit 480p
+        elif use_cuda_filters:
+            cmd.extend(["-vf", "scale_cuda=format=yuv420p"])  # 8-bit conversion only
+        elif resize:
+            cmd.extend(["-vf", "scale=-2:480,format=yuv420p"])  # CPU scaling to 8-bit 480p
         else:
-            cmd.extend([
-                "-vf", "scale=-2:480",  # CPU scaling for non-h264 inputs
-            ])
+            cmd.extend(["-vf", "format=yuv420p"])  # NVENC previews are 8-bit
         
-        # Optimized hardware encoding parameters
         cmd.extend([
-            "-c:v", "h264_nvenc",  # NVIDIA hardware encoder
-            "-preset", "medium",  # Legacy-compatible NVENC preset
-            "-tune", "hq",  # High quality tuning
-            "-rc", "vbr",  # Variable bitrate mode
-            "-rc-lookahead", "20",  # Lookahead for better quality
-            "-spatial_aq", "1",  # Spatial adaptive quantization
-            "-temporal_aq", "1",  # Temporal adaptive quantization
-            "-b:v", "700k",  # Target video bitrate
-            "-maxrate", "1000k",  # Maximum video bitrate
-            "-bufsize", "2000k",  # Buffer size
-            "-g", "30",  # Keyframe interval
-            "-bf", "0",  # No B-frames for baseline profile compatibility
-            "-movflags", "+faststart",  # Enable fast start for web playback
-            "-c:a", "aac",  # Use AAC audio codec
-            "-b:a", "128k",  # Audio bitrate
-            "-ac", "2",  # 2 audio channels (stereo)
-            "-ar", "44100",  # Audio sample rate
+            "-map", "0:v:0",
+            "-map", "0:a:0?",
+            *self._fill_template(f"hw_{codec}_preview", gop=gop),
             *self._muxing_queue_args(),
             output_path
         ])
         
         try:
-            subprocess.run(cmd, check=True, capture_output=True)
+            await self._run(cmd, uses_nvenc=True)
             return True
         except subprocess.CalledProcessError as e:
             print(f"Hardware preview encoding failed: {self._format_process_error(e)}")
             return False
     
-    def _encode_preview_with_software(
+    def _preview_gop(self, fps: float) -> int:
+        """Keyframe interval for previews: one keyframe every ~2 seconds"""
+        return max(30, int(round(fps * 2)))
+    
+    async def _encode_preview_with_software(
         self,
         input_path: str,
         output_path: str,
         start_time: float,
-        end_time: float
+        end_time: float,
+        codec: str,
+        resize: bool,
+        gop: int
     ):
         """Encode preview using software encoder with web optimization"""
         cmd = self._ffmpeg_cmd()
+        cmd.extend(self._cpu_filter_thread_args())
         
-        # Add trimming parameters
-        if start_time != 0:
-            cmd.extend(["-ss", str(start_time)])
+        cmd.extend(self._input_args(input_path, start_time, end_time))
         
-        if end_time != -1:
-            cmd.extend(["-to", str(end_time)])
+        # Sources already at or below 480p are not upscaled
+        if resize:
+            cmd.extend(["-vf", "scale=-2:480"])  # Scale to 480p maintaining aspect ratio
         
-        # Add input and encoding parameters optimized for web preview
         cmd.extend([
-            "-i", input_path,
-            "-vf", "scale=-2:480",  # Scale to 480p maintaining aspect ratio
-            "-c:v", "libx264",  # Use H.264 codec
-            "-preset", "medium",  # Balance between encoding speed and compression
-            "-crf", "26",  # Constant Rate Factor (lower = better quality)
-            "-profile:v", "baseline",  # Most compatible H.264 profile
-            "-movflags", "+faststart",  # Enable fast start for web playback
-            "-g", "30",  # Add keyframe every 30 frames
-            "-sc_threshold", "0",  # Disable scene change detection
-            "-keyint_min", "30",  # Minimum keyframe interval
-            "-b:v", "700k",  # Target video bitrate
-            "-maxrate", "1000k",  # Maximum video bitrate
-            "-bufsize", "2000k",  # Buffer size
-            "-c:a", "aac",  # Use AAC audio codec
-            "-b:a", "128k",  # Audio bitrate
-            "-ac", "2",  # 2 audio channels (stereo)
-            "-ar", "44100",  # Audio sample rate
+            *self._fill_template(f"sw_{codec}_preview", gop=gop),
             *self._muxing_queue_args(),
             output_path
         ])
         
         try:
-            subprocess.run(cmd, check=True, capture_output=True)
+            await self._run(cmd)
         except subprocess.CalledProcessError as e:
             error_msg = f"Software preview encoding failed: {self._format_process_error(e)}"
             print(error_msg)
             raise RuntimeError(error_msg)
     
-    def _reencode_for_web(
+    async def _reencode_for_web(
         self,
-        video: Path,
+        video: str,
+        output_path: str,
         start_time: float,
-        end_time: float
+        end_time: float,
+        codec: str = "h264",
+        force_reencode: bool = False
     ) -> Path:
         """Re-encode video optimized for web streaming
         
         This creates a video optimized for web by:
-        1. Using H.264 codec with medium preset for quality/speed balance
+        1. Using H.264 (or HEVC on request) with medium preset for quality/speed balance
         2. Adding frequent keyframes for fast seeking (every 2 seconds)
-        3. Using faststart for progressive download
+        3. Writing fragmented MP4 with the moov atom first for progressive download
         4. Using CRF 23 for good quality while keeping file sizes smaller
         5. Using high profile for better compression efficiency
         6. Capping resolution to 2K (1440p) max for web efficiency
         7. Capping bitrate to ensure smooth streaming on most connections
         8. Maintaining good visual quality while reducing file size
         """
-        # Create temporary output file
-        output_file = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False)
-        output_path = output_file.name
-        output_file.close()
+        if codec == "hevc" and not self._hevc_encoder_available():
+            print("No HEVC encoder available, falling back to H.264 for the web encode")
+            codec = "h264"
         
         # Check input video properties
-        input_codec = self._get_video_codec(str(video))
-        fps = self._get_video_fps(str(video))
-        width, height = self._get_video_resolution(str(video))
-        input_bitrate = self._get_video_bitrate(str(video))
+        info = await self._probe_all(video)
+        input_codec = info.codec
+        fps = info.fps
+        width, height = info.width, info.height
+        input_bitrate = info.bitrate
+        pix_fmt = info.pix_fmt
         
         print(f"Input video: codec={input_codec}, FPS={fps}, resolution={width}x{height}, bitrate={input_bitrate}")
 
@@ -601,36 +1090,62 @@ class Predictor(BasePredictor):
             scale_filter = None
             new_width, new_height = width, height
         
-        # Determine target bitrate based on resolution
+        # Determine target bitrate (kbps) based on resolution
         # Use conservative bitrates to reduce file size
         if new_height >= 1440:
-            target_bitrate = "8M"
-            max_bitrate = "12M"
+            target_kbps, max_kbps = 8000, 12000
         elif new_height >= 1080:
-            target_bitrate = "5M"
-            max_bitrate = "8M"
+            target_kbps, max_kbps = 5000, 8000
         elif new_height >= 720:
-            target_bitrate = "3M"
-            max_bitrate = "5M"
+            target_kbps, max_kbps = 3000, 5000
         else:
-            target_bitrate = "2M"
-            max_bitrate = "3M"
+            target_kbps, max_kbps = 2000, 3000
+        # The adjustments below size the encode relative to the input; inputs
+        # are judged against the resolution's own budget
+        tier_target_kbps = target_kbps
         
         # If input bitrate is lower, try to match or be slightly more efficient
         if input_bitrate:
-            input_bitrate_mbps = input_bitrate / 1000000
             # Use 80% of input bitrate as target, but not less than our minimums
-            calculated_target = max(2.0, input_bitrate_mbps * 0.8)
-            if calculated_target < float(target_bitrate.replace('M', '')):
-                target_bitrate = f"{int(calculated_target)}M"
-                max_bitrate = f"{int(calculated_target * 1.5)}M"
-                print(f"Adjusting bitrate based on input: target={target_bitrate}, max={max_bitrate}")
+            calculated_target = max(2000, int(input_bitrate * 0.8 / 1000))
+            if calculated_target < target_kbps:
+                target_kbps, max_kbps = calculated_target, int(calculated_target * 1.5)
+                print(f"Adjusting bitrate based on input: target={target_kbps}k, max={max_kbps}k")
+        
+        # HEVC reaches the same visual quality at roughly 30% less bitrate
+        h264_target_bitrate, h264_max_bitrate = f"{target_kbps}k", f"{max_kbps}k"
+        if codec == "hevc":
+            target_kbps, max_kbps = int(target_kbps * 0.7), int(max_kbps * 0.7)
+        
+        target_bitrate = f"{target_kbps}k"
+        max_bitrate = f"{max_kbps}k"
+        
+        # Untrimmed inputs that already fit the target only need a remux
+        already_web_ready = (
+            input_codec == codec
+            and pix_fmt == "yuv420p"
+            and height <= max_height
+            and input_bitrate is not None
+            and input_bitrate <= tier_target_kbps * 1000
+            and info.audio_codec in ("aac", None)
+        )
+        if already_web_ready and not force_reencode and start_time == 0 and end_time == -1:
+            # Only scan keyframes once everything cheaper has passed
+            keyframe_gap = await self._max_keyframe_gap(str(video))
+            if keyframe_gap is None:
+                print("Could not read the input keyframe interval, re-encoding")
+            elif keyframe_gap > _WEB_MAX_KEYFRAME_GAP:
+                print(f"Input keyframes are up to {keyframe_gap:.1f}s apart, re-encoding for seeking")
+            elif await self._remux_for_web(str(video), output_path, input_codec):
+                print("Input is already web-compatible, remuxed without re-encoding")
+                return Path(output_path)
         
         # Try hardware-accelerated encoding first
         if self.gpu_available:
-            success = self._encode_web_with_hardware(
-                str(video), output_path, start_time, end_time, input_codec, 
-                keyframe_interval, scale_filter, target_bitrate, max_bitrate
+            success = await self._encode_web_with_hardware(
+                str(video), output_path, start_time, end_time,
+                keyframe_interval, scale_filter, target_bitrate, max_bitrate,
+                codec, pix_fmt, gpu_decode=self._nvdec_can_decode(info)
             )
             if success:
                 print("Successfully encoded web-optimized video with hardware acceleration")
@@ -638,66 +1153,143 @@ class Predictor(BasePredictor):
         
         # Fallback to software encoding
         print("Using software encoding for web optimization")
-        self._encode_web_with_software(
+        if codec == "hevc" and not self.libx265_available:
+            # hevc_nvenc failed and the CPU can only write H.264, which needs
+            # the full H.264 budget
+            print("libx265 is unavailable, falling back to H.264 for the software web encode")
+            codec, target_bitrate, max_bitrate = "h264", h264_target_bitrate, h264_max_bitrate
+        await self._encode_web_with_software(
             str(video), output_path, start_time, end_time, keyframe_interval,
-            scale_filter, target_bitrate, max_bitrate
+            scale_filter, target_bitrate, max_bitrate, codec
         )
         
         return Path(output_path)
     
-    def _encode_web_with_hardware(
+    async def _max_keyframe_gap(self, input_path: str) -> float | None:
+        """Longest gap in seconds between video keyframes near the start
+        
+        Reads packet flags only, without decoding. Returns None if fewer
+        than two keyframes fall in the scanned window.
+        """
+        cmd = [
+            "ffprobe",
+            "-v", "error",
+            *self._protocol_whitelist_args(input_path),
+            "-select_streams", "v:0",
+            "-read_intervals", f"%+{_KEYFRAME_SCAN_SECONDS}",
+            "-show_entries", "packet=pts_time,flags",
+            "-of", "csv=p=0",
+            input_path
+        ]
+        try:
+            output = await self._run(cmd, capture_stdout=True)
+        except subprocess.CalledProcessError:
+            return None
+        
+        keyframes = []
+        for line in output.decode("utf-8", errors="replace").splitlines():
+            pts_time, _, flags = line.partition(",")
+            if "K" in flags and pts_time not in ("", "N/A"):
+                keyframes.append(float(pts_time))
+        keyframes.sort()
+        if len(keyframes) < 2:
+            return None
+        return max(later - earlier for earlier, later in zip(keyframes, keyframes[1:]))
+    
+    async def _remux_for_web(self, input_path: str, output_path: str, codec: str) -> bool:
+        """Copy the streams into a web-ready MP4 without re-encoding"""
+        cmd = self._ffmpeg_cmd()
+        cmd.extend([
+            *self._reconnect_args(input_path),
+            "-i", input_path,
+            "-map", "0:v:0",
+            "-map", "0:a:0?",
+            "-c", "copy",
+        ])
+        if codec == "hevc":
+            # hev1-tagged or untagged HEVC does not play in Safari/QuickTime
+            cmd.extend(["-tag:v", "hvc1"])
+        cmd.extend([
+            "-movflags", _FRAGMENTED_MOVFLAGS,
+            *self._muxing_queue_args(),
+            output_path
+        ])
+        try:
+            await self._run(cmd)
+            return True
+        except subprocess.CalledProcessError as e:
+            print(f"Web remux failed, re-encoding instead: {self._format_process_error(e)}")
+            return False
+    
+    async def _encode_web_with_hardware(
         self,
         input_path: str,
         output_path: str,
         start_time: float,
         end_time: float,
-        input_codec: str,
         keyframe_interval: int,
         scale_filter: str,
         target_bitrate: str,
-        max_bitrate: str
+        max_bitrate: str,
+        codec: str,
+        pix_fmt: str,
+        gpu_decode: bool
     ) -> bool:
         """Try to encode web-optimized video using hardware acceleration"""
         cmd = self._ffmpeg_cmd()
         
-        # Use hardware decoder if input is h264
-        use_cuda_filters = input_codec == "h264" and self.cuda_decoder_available
-        if use_cuda_filters:
-            cmd.extend([
-                "-hwaccel", "cuda",
-                "-hwaccel_output_format", "cuda",
-                "-c:v", "h264_cuvid"
-            ])
-        
-        # Add trimming parameters
-        if start_time != 0:
-            cmd.extend(["-ss", str(start_time)])
-        
-        if end_time != -1:
-            cmd.extend(["-to", str(end_time)])
-        
-        # Add input
-        cmd.extend(["-i", input_path])
+        # Keep the frames on the GPU when NVDEC decodes the input, unless
+        # they have to go through the CPU scaler. Otherwise ffmpeg picks any
+        # working hwaccel and hands the CPU filters system memory frames.
+        use_cuda_filters = gpu_decode and (
+            not scale_filter or self.cuda_scaling_available
+        )
+        cmd.extend(self._input_args(
+            input_path, start_time, end_time,
+            self._hwaccel_args(keep_frames_on_gpu=use_cuda_filters)
+        ))
         
-        # Apply scaling if needed (using GPU-accelerated scaling)
-        if scale_filter and use_cuda_filters and self.cuda_scaling_available:
-            # Use GPU scaling for h264 input
-            scale_filter_gpu = scale_filter.replace("scale=", "scale_cuda=")
-            cmd.extend(["-vf", scale_filter_gpu])
-        elif scale_filter:
-            # Use CPU scaling for non-h264 input
-            cmd.extend(["-vf", scale_filter])
+        # Only Main10 HEVC keeps 10-bit sources; every other encode is 8-bit
+        ten_bit = codec == "hevc" and "10" in pix_fmt
+        if use_cuda_filters:
+            # NVDEC hands over NV12, or P010 for 10-bit sources. Scaling and
+            # the conversion for 8-bit encodes share one scale_cuda pass.
+            options = [scale_filter.removeprefix("scale=")] if scale_filter else []
+            if not ten_bit and pix_fmt not in ("yuv420p", "yuvj420p", "nv12"):
+                options.append("format=yuv420p")
+            if options:
+                cmd.extend(["-vf", "scale_cuda=" + ":".join(options)])
+        else:
+            # Use CPU scaling when the frames are in system memory, and
+            # convert to a format NVENC takes
+            filters = [scale_filter] if scale_filter else []
+            filters.append("format=p010le" if ten_bit else "format=yuv420p")
+            cmd.extend(["-vf", ",".join(filters)])
         
         # Calculate bufsize (typically 2x maxrate)
-        maxrate_value = int(max_bitrate.replace('M', ''))
-        bufsize = f"{maxrate_value * 2}M"
+        bufsize = f"{int(max_bitrate.rstrip('k')) * 2}k"
+        
+        if codec == "hevc":
+            codec_args = [
+                "-c:v", "hevc_nvenc",  # NVIDIA hardware HEVC encoder
+                # 10-bit sources stay 10-bit instead of being truncated
+                "-profile:v", "main10" if "10" in pix_fmt else "main",
+                "-tag:v", "hvc1",  # Required for HEVC playback in Safari/QuickTime
+                # HEVC B-frames need Turing or newer
+                "-bf", "3" if self.gpu_compute_capability >= (7, 5) else "0",
+            ]
+        else:
+            codec_args = [
+                "-c:v", "h264_nvenc",  # NVIDIA hardware encoder
+                "-profile:v", "high",  # High profile for better compression efficiency
+                "-bf", "3",  # B-frames for high profile
+            ]
         
         # Hardware encoding parameters optimized for web
         # Use CQ 23 for good quality with smaller file sizes
         cmd.extend([
-            "-c:v", "h264_nvenc",  # NVIDIA hardware encoder
-            "-preset", "medium",  # Legacy-compatible NVENC preset
-            "-profile:v", "high",  # High profile for better compression efficiency
+            *codec_args,
+            "-preset", self._nvenc_preset("medium"),  # Balanced NVENC preset (p4)
             "-rc", "vbr",  # Variable bitrate mode
             "-cq", "23",  # Constant quality (similar to CRF 23) for good quality with smaller files
             "-rc-lookahead", "32",  # Lookahead for better quality
@@ -706,10 +1298,10 @@ class Predictor(BasePredictor):
             "-b:v", target_bitrate,  # Target bitrate (optimized for web)
             "-maxrate", max_bitrate,  # Maximum bitrate cap for smooth streaming
             "-bufsize", bufsize,  # Buffer size
+            # A fixed GOP alone; forcing keyframes on top of it cuts GOPs
+            # short and defeats the NVENC lookahead
             "-g", str(keyframe_interval),  # Keyframe interval (every 2 seconds)
-            "-force_key_frames", "expr:gte(t,n_forced*2)",  # Force keyframes every 2 seconds (more precise)
-            "-bf", "3",  # B-frames for high profile
-            "-movflags", "+faststart",  # Enable faststart for progressive download
+            "-movflags", _FRAGMENTED_MOVFLAGS,  # Fragmented MP4: moov written up front, no rewrite pass
             "-c:a", "aac",  # Use AAC audio codec
             "-b:a", "128k",  # Audio bitrate (reduced for smaller file size)
             "-ac", "2",  # 2 audio channels (stereo)
@@ -719,13 +1311,13 @@ class Predictor(BasePredictor):
         ])
         
         try:
-            subprocess.run(cmd, check=True, capture_output=True)
+            await self._run(cmd, uses_nvenc=True)
             return True
         except subprocess.CalledProcessError as e:
             print(f"Hardware web encoding failed: {self._format_process_error(e)}")
             return False
     
-    def _encode_web_with_software(
+    async def _encode_web_with_software(
         self,
         input_path: str,
         output_path: str,
@@ -734,20 +1326,13 @@ class Predictor(BasePredictor):
         keyframe_interval: int,
         scale_filter: str,
         target_bitrate: str,
-        max_bitrate: str
+        max_bitrate: str,
+        codec: str
     ):
         """Encode web-optimized video using software encoder"""
         cmd = self._ffmpeg_cmd()
-        
-        # Add trimming parameters
-        if start_time != 0:
-            cmd.extend(["-ss", str(start_time)])
-        
-        if end_time != -1:
-            cmd.extend(["-to", str(end_time)])
-        
-        # Add input
-        cmd.extend(["-i", input_path])
+        cmd.extend(self._cpu_filter_thread_args())
+        cmd.extend(self._input_args(input_path, start_time, end_time))
         
         # Build video filter chain
         vf_filters = []
@@ -759,25 +1344,40 @@ class Predictor(BasePredictor):
             cmd.extend(["-vf", ",".join(vf_filters)])
         
         # Calculate bufsize (typically 2x maxrate)
-        maxrate_value = int(max_bitrate.replace('M', ''))
-        bufsize = f"{maxrate_value * 2}M"
+        maxrate_kbps = int(max_bitrate.rstrip('k'))
+        bufsize_kbps = maxrate_kbps * 2
+        bufsize = f"{bufsize_kbps}k"
         
-        # Calculate maxrate and bufsize values for x264-params
-        maxrate_bps = int(max_bitrate.replace('M', '')) * 1000000
-        bufsize_bps = int(bufsize.replace('M', '')) * 1000000
+        # Fixed 2-second GOP without scene-cut keyframes and strict VBV
+        # limits, in one encoder parameter string. VBV values are in kbps.
+        encoder_params = (
+            f"keyint={keyframe_interval}:min-keyint={keyframe_interval}:scenecut=0"
+            f":vbv-maxrate={maxrate_kbps}:vbv-bufsize={bufsize_kbps}"
+        )
+        
+        if codec == "hevc" and self.libx265_available:
+            codec_args = [
+                "-c:v", "libx265",  # Use HEVC codec
+                "-preset", "medium",  # Medium preset for quality/speed balance
+                "-crf", "28",  # Roughly matches libx264 CRF 23 quality
+                "-tag:v", "hvc1",  # Required for HEVC playback in Safari/QuickTime
+                "-x265-params", encoder_params,
+            ]
+        else:
+            codec_args = [
+                "-c:v", "libx264",  # Use H.264 codec
+                "-preset", "medium",  # Medium preset for quality/speed balance
+                "-crf", "23",  # CRF 23 for good quality while keeping file sizes smaller
+                "-profile:v", "high",  # High profile for better compression efficiency
+                "-level", "4.0",  # H.264 level 4.0 for compatibility
+                "-x264-params", encoder_params,
+            ]
         
         cmd.extend([
-            "-c:v", "libx264",  # Use H.264 codec
-            "-preset", "medium",  # Medium preset for quality/speed balance
-            "-crf", "23",  # CRF 23 for good quality while keeping file sizes smaller
-            "-profile:v", "high",  # High profile for better compression efficiency
-            "-level", "4.0",  # H.264 level 4.0 for compatibility
-            "-x264-params", f"vbv-maxrate={maxrate_bps}:vbv-bufsize={bufsize_bps}",  # Enforce strict VBV limits for file size control
-            "-movflags", "+faststart",  # Enable faststart for progressive download
+            *codec_args,
+            "-threads", "0",  # Use every available core
+            "-movflags", _FRAGMENTED_MOVFLAGS,  # Fragmented MP4: moov written up front, no rewrite pass
             "-g", str(keyframe_interval),  # Keyframe interval (every 2 seconds, in frames)
-            "-force_key_frames", "expr:gte(t,n_forced*2)",  # Force keyframes every 2 seconds (more precise)
-            "-keyint_min", str(keyframe_interval),  # Minimum keyframe interval
-            "-sc_threshold", "0",  # Disable scene change detection (use fixed keyframes)
             "-maxrate", max_bitrate,  # Maximum video bitrate cap for smooth streaming
             "-bufsize", bufsize,  # Buffer size
             "-c:a", "aac",  # Use AAC audio codec
@@ -789,34 +1389,24 @@ class Predictor(BasePredictor):
         ])
         
         try:
-            subprocess.run(cmd, check=True, capture_output=True)
+            await self._run(cmd)
         except subprocess.CalledProcessError as e:
             error_msg = f"Software web encoding failed: {self._format_process_error(e)}"
             print(error_msg)
             raise RuntimeError(error_msg)
 
-    def _get_audio_bitrate(self, input_path: str) -> str:
+    async def _get_audio_bitrate(self, input_path: str) -> str:
         """Get the audio bitrate of the input video"""
-        try:
-            cmd = [
-                "ffprobe",
-                "-v", "error",
-                "-select_streams", "a:0",
-                "-show_entries", "stream=bit_rate",
-                "-of", "default=noprint_wrappers=1:nokey=1",
-                input_path
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            bitrate_str = result.stdout.strip()
-            if bitrate_str and bitrate_str != "N/A":
-                return bitrate_str
-            return "128000"
-        except (subprocess.CalledProcessError, ValueError):
-            return "128000"
-
-    def _trim_video_precise(
+        stream = self._first_stream(await self._probe(input_path), "audio")
+        bitrate_str = stream.get("bit_rate")
+        if bitrate_str and bitrate_str != "N/A":
+            return bitrate_str
+        return "128000"
+
+    async def _trim_video_precise(
         self,
-        video: Path,
+        video: str,
+        output_path: str,
         start_time: float,
         end_time: float
     ) -> Path:
@@ -826,14 +1416,10 @@ class Predictor(BasePredictor):
         frame-accurate duration. It probes the source bitrates to maintain
         relative quality and file size.
         """
-        output_file = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False)
-        output_path = output_file.name
-        output_file.close()
-
         input_path = str(video)
 
         # Probe source audio bitrate to preserve audio quality
-        audio_bitrate = self._get_audio_bitrate(input_path)
+        audio_bitrate = await self._get_audio_bitrate(input_path)
         audio_bitrate_str = str(audio_bitrate)
 
         print(f"trim_precise: start={start_time}, end={end_time}, "
@@ -845,7 +1431,7 @@ class Predictor(BasePredictor):
         if start_time != 0:
             cmd.extend(["-ss", str(start_time)])
 
-        cmd.extend(["-i", input_path])
+        cmd.extend([*self._reconnect_args(input_path), "-i", input_path])
 
         # Use -t (duration) instead of -to for precise duration control
         if end_time != -1:
@@ -857,7 +1443,7 @@ class Predictor(BasePredictor):
         if self.gpu_available:
             cmd.extend([
                 "-c:v", "h264_nvenc",
-                "-preset", "slow",
+                "-preset", self._nvenc_preset("slow"),
                 "-rc", "vbr",
                 "-cq", "17",
                 "-b:v", "0",
@@ -878,29 +1464,25 @@ class Predictor(BasePredictor):
         ])
 
         try:
-            subprocess.run(cmd, check=True, capture_output=True)
+            await self._run(cmd, uses_nvenc=self.gpu_available)
             print("trim_precise: completed successfully")
             return Path(output_path)
         except subprocess.CalledProcessError as e:
             print(f"trim_precise re-encode failed, falling back to stream copy: "
                   f"{self._format_process_error(e)}")
             # Fallback: stream copy (fast but may not be frame-accurate)
-            if os.path.exists(output_path):
-                os.unlink(output_path)
             fallback_cmd = self._ffmpeg_cmd()
             if start_time != 0:
                 fallback_cmd.extend(["-ss", str(start_time)])
-            fallback_cmd.extend(["-i", input_path])
+            fallback_cmd.extend([*self._reconnect_args(input_path), "-i", input_path])
             if end_time != -1:
                 duration = end_time - start_time
                 fallback_cmd.extend(["-t", str(duration)])
             fallback_cmd.extend(["-c", "copy", output_path])
             try:
-                subprocess.run(fallback_cmd, check=True, capture_output=True)
+                await self._run(fallback_cmd)
                 return Path(output_path)
             except subprocess.CalledProcessError as e2:
-                if os.path.exists(output_path):
-                    os.unlink(output_path)
                 error_msg = f"trim_precise fallback failed: {self._format_process_error(e2)}"
                 print(error_msg)
                 raise RuntimeError(error_msg)
@@ -1,8 +1,518 @@
+import asyncio
+import collections
+import functools
+import os
 import subprocess
 import tempfile
 
+import av
 import sieve
 
+# Input codecs decoded on the GPU through NVDEC. AV1 is left out because the
+# T4 (Turing) has no AV1 decoder.
+HWACCEL_CODECS = {"h264", "hevc", "vp9", "mpeg2video"}
+
+# NVENC replaced the x264-style preset names with p1 (fastest) .. p7 (best
+# quality) plus a separate -tune. The legacy names select deprecated presets.
+NVENC_PRESET_MAP = {
+    "ultrafast": "p1",
+    "superfast": "p1",
+    "veryfast": "p2",
+    "faster": "p3",
+    "fast": "p3",
+    "medium": "p4",
+    "slow": "p5",
+    "slower": "p6",
+    "veryslow": "p7",
+}
+# Rate control modes accepted by encoder_args
+RATE_CONTROLS = ("vbr", "cbr")
+# Re-encode strategies, best first: (pipeline, video encoder, extra NVDEC
+# surfaces). "cuda" decodes with NVDEC into GPU memory, "upload" decodes on
+# the CPU and uploads once for NVENC, "software" never touches the GPU. NVDEC
+# is retried once with a larger surface pool before leaving the GPU.
+STRATEGIES = [
+    ("cuda", "h264_nvenc", 8),
+    ("cuda", "h264_nvenc", 32),
+    ("upload", "h264_nvenc", 0),
+    ("software", "libx264", 0),
+]
+
+
+def plan_strategies(codec_name: str) -> list[tuple[str, str, int]]:
+    """Return the strategies worth trying for an input codec."""
+    if codec_name in HWACCEL_CODECS:
+        return STRATEGIES
+    return [strategy for strategy in STRATEGIES if strategy[0] != "cuda"]
+
+
+def probe_streams(path: str) -> tuple[str, str, int | None, str]:
+    """Return (codec_name, pix_fmt, bit_rate, audio_codec) for an input.
+
+    The first three describe the first video stream; audio_codec is the codec
+    of the first audio stream, or "" without audio. Results are cached per
+    (path, mtime, size), so pipelines that call the reencoder repeatedly on
+    the same file only open the container once.
+    """
+    return _probe_streams(path, os.path.getmtime(path), os.path.getsize(path))
+
+
+@functools.lru_cache(maxsize=1024)
+def _probe_streams(
+    path: str, mtime: float, size: int
+) -> tuple[str, str, int | None, str]:
+    # Faststart MP4/MOV files answer from their first few KB; anything the box
+    # peek can't settle is read in-process with PyAV
+    peeked = peek_mp4_streams(path, size)
+    if peeked is not None:
+        return peeked
+    with av.open(path) as container:
+        audio_codec = ""
+        if container.streams.audio:
+            audio_codec = container.streams.audio[0].codec_context.name
+        if not container.streams.video:
+            return "", "", None, audio_codec
+        stream = container.streams.video[0]
+        return (
+            stream.codec_context.name,
+            stream.codec_context.format.name if stream.codec_context.format else "",
+            stream.bit_rate or None,
+            audio_codec,
+        )
+
+
+def _iter_boxes(buf: bytes, start: int, end: int):
+    """Yield (type, payload_start, box_end) for the ISO-BMFF boxes in buf."""
+    while start + 8 <= end:
+        size = int.from_bytes(buf[start : start + 4], "big")
+        box_type = buf[start + 4 : start + 8]
+        header = 8
+        if size == 1:
+            if start + 16 > end:
+                return
+            size = int.from_bytes(buf[start + 8 : start + 16], "big")
+            header = 16
+        elif size == 0:
+            size = end - start
+        if size < header:
+            return
+        yield box_type, start + header, min(start + size, end)
+        start += size
+
+
+def _find_box(buf: bytes, start: int, end: int, path: list[bytes]):
+    """Return the (payload_start, box_end) of the first box along path."""
+    for box_type, payload, box_end in _iter_boxes(buf, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return payload, box_end
+            found = _find_box(buf, payload, box_end, path[1:])
+            if found is not None:
+                return found
+    return None
+
+
+def _read_descriptor(buf: bytes, pos: int) -> tuple[int, int]:
+    """Return the (tag, payload_start) of the MPEG-4 descriptor at pos."""
+    tag = buf[pos]
+    pos += 1
+    # The length takes up to four bytes, 7 bits each; only its extent matters
+    for _ in range(4):
+        pos += 1
+        if not buf[pos - 1] & 0x80:
+            break
+    return tag, pos
+
+
+def _peek_video_entry(buf: bytes, entry: int, end: int) -> tuple[str, str] | None:
+    """Return the (codec_name, pix_fmt) of a visual sample entry."""
+    fourcc = buf[entry + 4 : entry + 8]
+    # Skip the 78 bytes of VisualSampleEntry fields to the codec config box
+    config = _find_box(buf, entry + 86, end, [b"avcC"]) or _find_box(
+        buf, entry + 86, end, [b"hvcC"]
+    )
+    if config is None or config[0] + 2 > config[1]:
+        return None
+    profile = buf[config[0] + 1]
+
+    if fourcc in (b"avc1", b"avc3") and profile in (66, 77, 88, 100):
+        # Baseline, Main, Extended and High are 8-bit 4:2:0 by definition
+        return "h264", "yuv420p"
+    if fourcc in (b"hvc1", b"hev1") and profile & 0x1F in (1, 2):
+        return "hevc", "yuv420p" if profile & 0x1F == 1 else "yuv420p10le"
+    return None
+
+
+def _peek_audio_entry(buf: bytes, entry: int, end: int) -> str | None:
+    """Return the codec name of an audio sample entry, if it is AAC."""
+    if buf[entry + 4 : entry + 8] != b"mp4a":
+        return None
+    # QuickTime sound descriptions v1 and v2 extend the 28-byte
+    # AudioSampleEntry fields by 16 and 36 bytes
+    version = int.from_bytes(buf[entry + 16 : entry + 18], "big")
+    extra = {0: 0, 1: 16, 2: 36}.get(version)
+    if extra is None:
+        return None
+    esds = _find_box(buf, entry + 36 + extra, end, [b"esds"])
+    if esds is None:
+        return None
+
+    # mp4a also carries MP3; the decoder config's object type tells them apart
+    try:
+        tag, pos = _read_descriptor(buf, esds[0] + 4)
+        if tag != 0x03:
+            return None
+        flags = buf[pos + 2]
+        pos += 3
+        if flags & 0x80:
+            pos += 2
+        if flags & 0x40:
+            pos += 1 + buf[pos]
+        if flags & 0x20:
+            pos += 2
+        tag, pos = _read_descriptor(buf, pos)
+        if tag != 0x04:
+            return None
+        object_type = buf[pos]
+    except IndexError:
+        return None
+    # MPEG-4 AAC and the three MPEG-2 AAC profiles
+    return "aac" if object_type in (0x40, 0x66, 0x67, 0x68) else None
+
+
+def peek_mp4_streams(
+    path: str, size: int, peek_bytes: int = 65536
+) -> tuple[str, str, int | None, str] | None:
+    """Read probe_streams' result straight from an MP4/MOV header.
+
+    Only looks at the first peek_bytes of the file, so it answers for
+    faststart files whose moov box comes first. Returns None whenever the
+    header is elsewhere, fragmented, or doesn't pin down the pixel format or
+    the audio codec. bit_rate is the container average, an upper bound on
+    the video stream's.
+    """
+    with open(path, "rb") as f:
+        buf = os.pread(f.fileno(), peek_bytes, 0)
+
+    if buf[4:8] != b"ftyp":
+        return None
+    moov = _find_box(buf, 0, len(buf), [b"moov"])
+    if moov is None:
+        return None
+
+    video = None
+    audio_codec = ""
+    for box_type, trak, trak_end in _iter_boxes(buf, *moov):
+        if box_type != b"trak":
+            continue
+        hdlr = _find_box(buf, trak, trak_end, [b"mdia", b"hdlr"])
+        handler = buf[hdlr[0] + 8 : hdlr[0] + 12] if hdlr is not None else b""
+        if handler == b"vide" and video is None:
+            kind = "video"
+        elif handler == b"soun" and not audio_codec:
+            kind = "audio"
+        else:
+            continue
+        stsd = _find_box(buf, trak, trak_end, [b"mdia", b"minf", b"stbl", b"stsd"])
+        if stsd is None:
+            return None
+        # Skip version/flags and entry_count to the first sample entry
+        entry = stsd[0] + 8
+        if kind == "video":
+            video = _peek_video_entry(buf, entry, stsd[1])
+            if video is None:
+                return None
+        else:
+            audio_codec = _peek_audio_entry(buf, entry, stsd[1])
+            if audio_codec is None:
+                return None
+    if video is None:
+        return None
+
+    mvhd = _find_box(buf, *moov, [b"mvhd"])
+    if mvhd is None:
+        return None
+    if buf[mvhd[0]] == 1:
+        timescale = int.from_bytes(buf[mvhd[0] + 20 : mvhd[0] + 24], "big")
+        duration = int.from_bytes(buf[mvhd[0] + 24 : mvhd[0] + 32], "big")
+    else:
+        timescale = int.from_bytes(buf[mvhd[0] + 12 : mvhd[0] + 16], "big")
+        duration = int.from_bytes(buf[mvhd[0] + 16 : mvhd[0] + 20], "big")
+    # Fragmented files leave the duration to the fragments
+    if not timescale or not duration:
+        return None
+    return *video, int(size * 8 * timescale / duration), audio_codec
+
+
+def build_ffmpeg_cmd(
+    input_path: str,
+    output_path: str,
+    *,
+    start_time: float,
+    duration: float | None,
+    preset: str,
+    vcodec: str,
+    hwaccel_in: bool,
+    video_filter: str | None,
+    extra_hw_frames: int = 8,
+    quality: int = 23,
+    rate_control: str = "vbr",
+    audio_copy: bool = False,
+) -> list[str]:
+    """Assemble one trim + re-encode command for the given pipeline."""
+    cmd = ["ffmpeg", "-y", "-loglevel", "error"]
+
+    if hwaccel_in:
+        cmd.extend(hwaccel_args(extra_hw_frames))
+
+    # Add trimming parameters. -ss before -i seeks the demuxer (the decoder
+    # starts at the keyframe before start_time and drops the frames up to
+    # it), and -t after -i stops once the requested duration is written.
+    if start_time != 0:
+        cmd.extend(["-ss", str(start_time)])
+
+    cmd.extend(["-i", input_path])
+
+    # audio_copy describes the first audio stream; without -map ffmpeg picks
+    # the one with the most channels
+    cmd.extend(["-map", "0:v:0", "-map", "0:a:0?"])
+
+    if duration is not None:
+        cmd.extend(["-t", str(duration)])
+
+    if video_filter:
+        cmd.extend(["-vf", video_filter])
+
+    cmd.extend(
+        [*encoder_args(vcodec, preset, quality, rate_control, audio_copy), output_path]
+    )
+    return cmd
+
+
+def build_batch_cmd(
+    input_path: str,
+    outputs: list[tuple[str, float, float | None]],
+    *,
+    seek_time: float,
+    preset: str,
+    vcodec: str,
+    hwaccel_in: bool,
+    video_filter: str | None,
+    extra_hw_frames: int = 8,
+    quality: int = 23,
+    rate_control: str = "vbr",
+    audio_copy: bool = False,
+) -> list[str]:
+    """Assemble one command that decodes the input once and writes every cut.
+
+    The input is seeked to seek_time. Each output is (path, offset, duration)
+    with the offset relative to seek_time; output-side -ss drops the frames
+    before each cut instead of encoding them. video_filter runs once and is
+    split to every output, so frames are uploaded or converted only once.
+    """
+    cmd = ["ffmpeg", "-y", "-loglevel", "error"]
+
+    if hwaccel_in:
+        cmd.extend(hwaccel_args(extra_hw_frames))
+
+    if seek_time != 0:
+        cmd.extend(["-ss", str(seek_time)])
+
+    cmd.extend(["-i", input_path])
+
+    video_maps = ["0:v:0"] * len(outputs)
+    if video_filter:
+        video_maps = [f"[v{i}]" for i in range(len(outputs))]
+        cmd.extend(
+            [
+                "-filter_complex",
+                f"[0:v:0]{video_filter},split={len(outputs)}{''.join(video_maps)}",
+            ]
+        )
+
+    for (output_path, offset, duration), video_map in zip(outputs, video_maps):
+        cmd.extend(["-map", video_map, "-map", "0:a:0?"])
+        if offset != 0:
+            cmd.extend(["-ss", str(offset)])
+        if duration is not None:
+            cmd.extend(["-t", str(duration)])
+        cmd.extend(
+            [
+                *encoder_args(vcodec, preset, quality, rate_control, audio_copy),
+                output_path,
+            ]
+        )
+
+    return cmd
+
+
+def hwaccel_args(extra_hw_frames: int) -> list[str]:
+    """Decoder options that keep NVDEC output in GPU memory.
+
+    -hwaccel cuda picks the NVDEC decoder for the input codec. Long-GOP or
+    many-reference streams need more decode surfaces than NVDEC allocates by
+    default and otherwise fail to initialize; a single decoder thread keeps
+    frame threading from multiplying the surfaces needed.
+    """
+    return [
+        "-hwaccel",
+        "cuda",
+        "-hwaccel_output_format",
+        "cuda",
+        "-extra_hw_frames",
+        str(extra_hw_frames),
+        "-threads",
+        "1",
+    ]
+
+
+def encoder_args(
+    vcodec: str,
+    preset: str,
+    quality: int = 23,
+    rate_control: str = "vbr",
+    audio_copy: bool = False,
+) -> list[str]:
+    """Video, audio and muxer options for one output.
+
+    "vbr" targets a constant quality (NVENC -cq, x264 -crf) under a 20M VBV
+    cap, so simple scenes don't pad out to the full bitrate. "cbr" holds a
+    constant 20M. audio_copy passes AAC input audio through untouched.
+    """
+    check_rate_control(rate_control)
+
+    args = []
+    if vcodec == "h264_nvenc":
+        args.extend(
+            [
+                "-c:v",
+                "h264_nvenc",  # NVIDIA hardware acceleration
+                "-preset",
+                NVENC_PRESET_MAP.get(preset, preset),
+                "-tune",
+                "hq",
+            ]
+        )
+        if rate_control == "vbr":
+            # -b:v must be 0, NVENC ignores -cq under a nonzero target bitrate
+            args.extend(["-rc", "vbr", "-cq", str(quality), "-b:v", "0"])
+        else:
+            # Explicit CBR with a VBV cap; -b:v alone lets the preset's
+            # rate control undershoot the target by a wide margin
+            args.extend(["-rc", "cbr", "-b:v", "20M"])
+    else:
+        args.extend(["-c:v", vcodec, "-preset", preset])
+        if rate_control == "vbr":
+            args.extend(["-crf", str(quality)])
+        else:
+            args.extend(["-b:v", "20M"])
+
+    args.extend(["-maxrate", "20M", "-bufsize", "40M"])
+
+    if audio_copy:
+        args.extend(["-c:a", "copy"])
+    else:
+        args.extend(["-c:a", "aac", "-b:a", "128k"])
+
+    # Put the moov atom first so players can stream over range requests
+    args.extend(["-movflags", "+faststart"])
+    return args
+
+
+def check_rate_control(rate_control: str) -> None:
+    """Raise ValueError for a rate control encoder_args does not support."""
+    if rate_control not in RATE_CONTROLS:
+        raise ValueError(
+            f"Unknown rate control: {rate_control} (expected one of {RATE_CONTROLS})"
+        )
+
+
+def build_filter(mode: str, pix_fmt: str) -> str | None:
+    """Return the -vf chain that hands frames to the encoder of a pipeline.
+
+    "cuda" frames are already in GPU memory; only high bit depth sources need
+    converting, which scale_cuda does in place. "upload" frames come from the
+    CPU decoder and are uploaded once as NV12 for NVENC. "software" frames
+    never leave system memory.
+    """
+    if mode == "cuda":
+        # NVENC H.264 only takes 8-bit 4:2:0
+        if "p10" in pix_fmt or "p12" in pix_fmt:
+            return "scale_cuda=format=yuv420p"
+        return None
+    if mode == "upload":
+        return "format=nv12,hwupload_cuda"
+    return None
+
+
+def discard(*paths: str) -> None:
+    """Delete temporary files, ignoring ones that are already gone."""
+    for path in paths:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+async def run_ok(cmd: list[str], duration: float | None = None) -> bool:
+    """Run an ffmpeg command, reporting failure instead of raising."""
+    try:
+        await run_ffmpeg(cmd, duration)
+        return True
+    except subprocess.CalledProcessError as e:
+        print(f"Error details: {e.stderr.decode('utf-8', errors='replace')}")
+        return False
+
+
+async def run_ffmpeg(cmd: list[str], duration: float | None = None) -> None:
+    """Run an ffmpeg command without blocking the event loop.
+
+    ffmpeg reports progress on stdout through -progress, which is printed as
+    it encodes; stderr is drained concurrently so neither pipe can fill up and
+    stall the encode. Only the tail of stderr is kept for the
+    CalledProcessError raised on failure.
+    """
+    cmd = [cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]]
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    stderr_tail = collections.deque(maxlen=64)
+
+    async def drain_stderr():
+        async for line in proc.stderr:
+            stderr_tail.append(line)
+
+    async def report_progress():
+        reported = 0
+        async for line in proc.stdout:
+            key, _, value = (
+                line.decode("utf-8", errors="replace").strip().partition("=")
+            )
+            if key != "out_time_us" or not value.isdigit():
+                continue
+            seconds = int(value) / 1_000_000
+            if duration:
+                percent = min(100, int(seconds * 100 / duration))
+                if percent >= reported + 10:
+                    reported = percent - percent % 10
+                    print(f"Encoding progress: {reported}%")
+            elif seconds >= reported + 10:
+                reported = int(seconds) - int(seconds) % 10
+                print(f"Encoding progress: {reported}s written")
+
+    try:
+        await asyncio.gather(report_progress(), drain_stderr())
+        await proc.wait()
+    except asyncio.CancelledError:
+        proc.kill()
+        await proc.wait()
+        raise
+
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(
+            proc.returncode, cmd, stderr=b"".join(stderr_tail)
+        )
+
 
 @sieve.function(
     name="video-reencoder",
@@ -10,7 +520,7 @@ import sieve
         description="Re-encode and trim videos using hardware-accelerated H264 encoding",
     ),
     python_version="3.11",
-    python_packages=["opencv-python-headless"],
+    python_packages=["opencv-python-headless", "av"],
     system_packages=["ffmpeg"],
     gpu=sieve.gpu.T4(),
 )
@@ -19,153 +529,221 @@ def reencoder(
     start_time: float = 0,
     end_time: float = -1,
     preset: str = "medium",
+    quality: int = 23,
+    rate_control: str = "vbr",
 ) -> sieve.File:
     """
     Args:
         video: Input video file
         start_time: Start time in seconds for trimming (default: 0 - start of video)
         end_time: End time in seconds for trimming (default: -1 - end of video)
-        quality: CRF quality value (lower = better quality, higher = smaller file)
         preset: FFmpeg encoding preset (options: ultrafast, superfast, veryfast, faster, fast, medium, slow, slower, veryslow)
+        quality: Constant quality target for "vbr" rate control (lower = better quality, higher = smaller file)
+        rate_control: "vbr" for a quality-targeted bitrate capped at 20M, "cbr" for a constant 20M
     """
-    input_path = video.path
-    output_file = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False)
-    output_path = output_file.name
-    output_file.close()
-
-    # Construct base ffmpeg command
-    cmd = [
-        "ffmpeg",
-        "-y",
-        "-c:v",
-        "h264_cuvid",
-    ]
+    return asyncio.run(
+        reencode(video, start_time, end_time, preset, quality, rate_control)
+    )
 
-    # Add trimming parameters
-    if start_time != 0:
-        cmd.extend(["-ss", str(start_time)])
 
-    if end_time != -1:
-        cmd.extend(["-to", str(end_time)])
+async def reencode(
+    video: sieve.File,
+    start_time: float = 0,
+    end_time: float = -1,
+    preset: str = "medium",
+    quality: int = 23,
+    rate_control: str = "vbr",
+) -> sieve.File:
+    """Async core of reencoder, for callers running several encodes at once.
 
-    # Add encoding parameters with hardware acceleration
-    cmd.extend(
-        [
-            "-i",
-            input_path,
-            "-c:v",
-            "h264_nvenc",  # NVIDIA hardware acceleration
-            "-preset",
-            preset,
-            "-b:v",
-            "20M",  # Use CRF for quality control
-            "-c:a",
-            "aac",
-            output_path,
-        ]
-    )
-    # check encoding of input video
-    ffprobe_cmd = [
-        "ffprobe",
-        "-v",
-        "error",
-        "-select_streams",
-        "v:0",
-        "-show_entries",
-        "stream=codec_name",
-        "-of",
-        "default=noprint_wrappers=1:nokey=1",
-        input_path,
-    ]
-    ffprobe_output = subprocess.check_output(ffprobe_cmd, text=True)
-    if "h264_cuvid" in ffprobe_output:
-        print("Hardware accelerated encoding enabled")
-    else:
-        print(
-            "Hardware accelerated encoding disabled, falling back to software encoding"
-        )
+    Nothing here limits concurrent NVENC sessions; callers gathering several
+    encodes on one GPU bound them themselves.
+    """
+    # Validate before the stream-copy shortcut, which never builds encoder args
+    check_rate_control(rate_control)
+    input_path = video.path
+    duration = end_time - start_time if end_time != -1 else None
+    fd, output_path = tempfile.mkstemp(suffix=".mp4")
+    os.close(fd)
 
-    # Execute command and capture stdout and stderr
     try:
-        if ffprobe_output.strip() == "h264_cuvid":
-            subprocess.run(
-                cmd,
-                check=True,
-            )
+        # check encoding of input video
+        codec_name, pix_fmt, bit_rate, audio_codec = await asyncio.to_thread(
+            probe_streams, input_path
+        )
+        audio_copy = audio_codec == "aac"
+
+        # An untrimmed 8-bit H.264 input at or under the target bitrate is
+        # already what this function produces, so only remux it
+        if (
+            start_time == 0
+            and end_time == -1
+            and codec_name == "h264"
+            and pix_fmt == "yuv420p"
+            and bit_rate is not None
+            and bit_rate <= 20_000_000
+        ):
+            try:
+                await run_ffmpeg(
+                    [
+                        "ffmpeg",
+                        "-y",
+                        "-loglevel",
+                        "error",
+                        "-i",
+                        input_path,
+                        "-c",
+                        "copy",
+                        "-movflags",
+                        "+faststart",
+                        output_path,
+                    ]
+                )
+                print("Input already matches the target, copied without re-encoding")
+                return sieve.File(path=output_path)
+            except subprocess.CalledProcessError:
+                print("Stream copy failed, re-encoding instead")
+
+        # Plan the pipelines to try, best first: NVDEC -> NVENC with frames kept
+        # on the GPU, CPU decode uploaded once to NVENC, and CPU-only encoding.
+        if codec_name in HWACCEL_CODECS:
+            print("Hardware accelerated decoding enabled")
         else:
-            raise ValueError("Hardware accelerated decoding not supported.")
-    except Exception as e:
-        if isinstance(e, subprocess.CalledProcessError):
-            print(
-                "Hardware accelerated decoding failed, falling back to normal decoding"
+            print("Hardware accelerated decoding not supported, decoding on the CPU")
+
+        for mode, vcodec, extra_hw_frames in plan_strategies(codec_name):
+            cmd = build_ffmpeg_cmd(
+                input_path,
+                output_path,
+                start_time=start_time,
+                duration=duration,
+                preset=preset,
+                vcodec=vcodec,
+                hwaccel_in=mode == "cuda",
+                video_filter=build_filter(mode, pix_fmt),
+                extra_hw_frames=extra_hw_frames,
+                quality=quality,
+                rate_control=rate_control,
+                audio_copy=audio_copy,
             )
 
-        # If hardware acceleration fails, fall back to software encoding
-        fallback_cmd = ["ffmpeg", "-y", "-loglevel", "error"]
+            if await run_ok(cmd, duration):
+                break
+            print(f"Re-encoding with the {mode} pipeline ({vcodec}) failed")
+        else:
+            raise RuntimeError("Re-encoding failed with every strategy")
+    except BaseException:
+        # Failed or cancelled encodes must not leak their reserved output
+        discard(output_path)
+        raise
 
-        # Add trimming parameters
-        if start_time != 0:
-            fallback_cmd.extend(["-ss", str(start_time)])
+    return sieve.File(path=output_path)
 
-        if end_time != -1:
-            fallback_cmd.extend(["-to", str(end_time)])
 
-        # Software encoding parameters
-        fallback_cmd.extend(
-            [
-                "-i",
-                input_path,
-                "-c:v",
-                "h264_nvenc",  # NVIDIA hardware acceleration
-                "-preset",
-                preset,
-                "-b:v",
-                "20M",  # Use CRF for quality control
-                "-c:a",
-                "aac",
-                output_path,
-            ]
-        )
+@sieve.function(
+    name="video-reencoder-batch",
+    metadata=sieve.Metadata(
+        description="Re-encode several cuts of one video in a single hardware-accelerated pass",
+    ),
+    python_version="3.11",
+    python_packages=["opencv-python-headless", "av"],
+    system_packages=["ffmpeg"],
+    gpu=sieve.gpu.T4(),
+)
+def reencoder_batch(
+    video: sieve.File,
+    cuts: list,
+    preset: str = "medium",
+    quality: int = 23,
+    rate_control: str = "vbr",
+) -> list:
+    """
+    Args:
+        video: Input video file
+        cuts: List of [start_time, end_time] pairs in seconds (end_time -1 for end of video)
+        preset: FFmpeg encoding preset (options: ultrafast, superfast, veryfast, faster, fast, medium, slow, slower, veryslow)
+        quality: Constant quality target for "vbr" rate control (lower = better quality, higher = smaller file)
+        rate_control: "vbr" for a quality-targeted bitrate capped at 20M, "cbr" for a constant 20M
+
+    Returns one re-encoded file per cut, in order. The input is opened,
+    probed and decoded once for all cuts. Each cut is a separate NVENC
+    encoder, so a batch holds one NVENC session per cut while it runs.
+    """
+    return asyncio.run(reencode_batch(video, cuts, preset, quality, rate_control))
+
+
+async def reencode_batch(
+    video: sieve.File,
+    cuts: list,
+    preset: str = "medium",
+    quality: int = 23,
+    rate_control: str = "vbr",
+) -> list:
+    """Async core of reencoder_batch."""
+    check_rate_control(rate_control)
+    if not cuts:
+        raise ValueError("cuts must contain at least one [start_time, end_time] pair")
+    for cut in cuts:
         try:
-            subprocess.run(fallback_cmd, check=True)
-        except subprocess.CalledProcessError as e:
-            print(
-                "Hardware accelerated encoding failed, falling back to software encoding."
+            start_time, end_time = cut
+        except (TypeError, ValueError):
+            raise ValueError(f"Each cut must be a [start_time, end_time] pair: {cut!r}")
+        if start_time < 0 or (end_time != -1 and end_time <= start_time):
+            raise ValueError(
+                f"Invalid cut {cut!r}: need 0 <= start_time < end_time, or end_time -1"
             )
-            print(f"Error details: {e.stderr.decode('utf-8')}")
-            fallback_cmd = [
-                "ffmpeg",
-                "-y",
-                "-loglevel",
-                "error",
-            ]
-            if start_time != 0:
-                fallback_cmd.extend(["-ss", str(start_time)])
-
-            if end_time != -1:
-                fallback_cmd.extend(["-to", str(end_time)])
-
-            # Software encoding parameters
-            fallback_cmd.extend(
-                [
-                    "-i",
-                    input_path,
-                    "-preset",
-                    preset,
-                    "-b:v",
-                    "20M",  # Use CRF for quality control
-                    "-c:a",
-                    "aac",
-                    output_path,
-                ]
+
+    if len(cuts) == 1:
+        start_time, end_time = cuts[0]
+        return [
+            await reencode(video, start_time, end_time, preset, quality, rate_control)
+        ]
+
+    input_path = video.path
+    outputs = []
+    try:
+        codec_name, pix_fmt, _, audio_codec = await asyncio.to_thread(
+            probe_streams, input_path
+        )
+        audio_copy = audio_codec == "aac"
+
+        # Seek once to the earliest cut and express every cut relative to it
+        seek_time = min(start for start, _ in cuts)
+        for start_time, end_time in cuts:
+            fd, output_path = tempfile.mkstemp(suffix=".mp4")
+            os.close(fd)
+            duration = end_time - start_time if end_time != -1 else None
+            outputs.append((output_path, start_time - seek_time, duration))
+
+        ends = [end for _, end in cuts]
+        total = max(ends) - seek_time if -1 not in ends else None
+
+        for mode, vcodec, extra_hw_frames in plan_strategies(codec_name):
+            cmd = build_batch_cmd(
+                input_path,
+                outputs,
+                seek_time=seek_time,
+                preset=preset,
+                vcodec=vcodec,
+                hwaccel_in=mode == "cuda",
+                video_filter=build_filter(mode, pix_fmt),
+                extra_hw_frames=extra_hw_frames,
+                quality=quality,
+                rate_control=rate_control,
+                audio_copy=audio_copy,
             )
-            try:
-                subprocess.run(fallback_cmd, check=True)
-            except subprocess.CalledProcessError as e:
-                print(f"Re-encoding failed: {e}")
-                print(f"Error details: {e.stderr.decode('utf-8')}")
-                raise e
-    return sieve.File(path=output_path)
+
+            if await run_ok(cmd, total):
+                break
+            print(f"Batch re-encoding with the {mode} pipeline ({vcodec}) failed")
+        else:
+            raise RuntimeError("Batch re-encoding failed with every strategy")
+    except BaseException:
+        # Failed or cancelled encodes must not leak their reserved outputs
+        discard(*(output_path for output_path, _, _ in outputs))
+        raise
+
+    return [sieve.File(path=output_path) for output_path, _, _ in outputs]
 
 
 if __name__ == "__main__":